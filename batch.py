@@ -0,0 +1,131 @@
+"""Process many months in one run, for example to backfill after a rule change.
+
+python batch.py --all
+python batch.py --start 2023-11 --end 2024-05 --workers 4
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List
+import config
+import delta
+import pipeline
+import writers
+
+
+def get_months(start: str = None, end: str = None) -> List[str]:
+    """Return the month folders under input/ between start and end (inclusive).
+
+    :param str start: first month like 2023-11, None for the earliest folder.
+    :param str end: last month like 2024-05, None for the latest folder.
+    :return List[str]: sorted months.
+    """
+    months = sorted(path.name for path in Path("input").iterdir() if path.is_dir())
+    return [
+        month
+        for month in months
+        if (start is None or month >= start) and (end is None or month <= end)
+    ]
+
+
+def process(month: str, force: bool = False, formats: List[str] = None) -> dict:
+    """Process one month and return its summary.
+    The extracts are read in this process, the months are already spread over the workers.
+    The delta is not written here, the previous month may still be processed by another worker,
+    see write_deltas.
+    The results of the string transforms are reused by every month of the worker, see pipeline.memo.
+
+    :param str month: month folder under input/.
+    :param bool force: rebuild the output even if it is up to date.
+    :param List[str] formats: output formats, default to config.output_formats.
+    :return dict: month, row counts, seconds, whether it was skipped and error (None if it succeeded).
+    """
+    summary = {
+        "month": month, "raw_rows": 0, "unique_rows": 0, "output_rows": 0,
+        "skipped": False, "error": None,
+    }
+    start_time = time.perf_counter()
+    report = {}
+    try:
+        with pipeline.use_settings({"write_delta": False}):
+            df_clean = pipeline.process_month(
+                month, n_workers=1, force=force, formats=formats, memo=pipeline.memo, report=report
+            )
+        if df_clean is None:
+            summary["skipped"] = True
+        else:
+            stages = {record["name"]: record for record in report["stages"]}
+            # note: load_clean when the extracts are read in chunks, see config.chunksize
+            load = stages.get("load") or stages["load_clean"]
+            summary["raw_rows"] = load["rows_in"]
+            summary["unique_rows"] = load.get("unique_rows", load["rows_out"])
+            summary["output_rows"] = len(df_clean)
+    except Exception as e:  # note: report the failed month and continue with the others
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["seconds"] = time.perf_counter() - start_time
+    return summary
+
+
+def write_deltas(months: List[str], formats: List[str] = None) -> None:
+    """Write the delta of each month from its saved output, in month order,
+    once every month is done so that each delta reads the final output of the previous month.
+
+    :param List[str] months: months to write the delta of.
+    :param List[str] formats: output formats, default to config.output_formats.
+    """
+    for month in sorted(months):
+        df_clean = writers.read(Path("output", month), config.output_name)
+        delta.write_delta(df_clean, month, formats)
+
+
+def run(
+    months: List[str], n_workers: int = None, force: bool = False, formats: List[str] = None
+) -> List[dict]:
+    """Process the months concurrently and print a summary per month.
+    If config.write_delta, the deltas are written after all months, see write_deltas.
+
+    :param List[str] months: months to process.
+    :param int n_workers: number of worker processes, default to the number of CPUs.
+    :param bool force: rebuild the outputs even if they are up to date.
+    :param List[str] formats: output formats, default to config.output_formats.
+    :return List[dict]: summary of each month, in the order of months.
+    """
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        summaries = list(
+            executor.map(process, months, [force] * len(months), [formats] * len(months))
+        )
+
+    print(f"{'month':<10}{'raw rows':>10}{'unique rows':>13}{'output rows':>13}{'seconds':>9}")
+    for summary in summaries:
+        print(
+            f"{summary['month']:<10}{summary['raw_rows']:>10}{summary['unique_rows']:>13}"
+            f"{summary['output_rows']:>13}{summary['seconds']:>9.1f}"
+            + (f"  FAILED {summary['error']}" if summary["error"] else "")
+            + ("  up to date" if summary["skipped"] else "")
+        )
+    if config.write_delta:
+        write_deltas([summary["month"] for summary in summaries if not summary["error"]], formats)
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process many months of Coco member data.")
+    parser.add_argument("--all", action="store_true", help="process every folder under input/")
+    parser.add_argument("--start", help="first month, like 2023-11")
+    parser.add_argument("--end", help="last month, like 2024-05")
+    parser.add_argument("--workers", type=int, help="number of months processed at once")
+    parser.add_argument(
+        "--force", action="store_true", help="rebuild the outputs even if they are up to date"
+    )
+    parser.add_argument(
+        "--formats", nargs="+", help="output formats (xlsx, parquet, feather, csv)"
+    )
+    args = parser.parse_args()
+
+    if not (args.all or args.start or args.end):
+        parser.error("specify --all or a month range with --start / --end")
+    months = get_months(args.start, args.end)
+    summaries = run(months, args.workers, force=args.force, formats=args.formats)
+    if any(summary["error"] for summary in summaries):
+        raise SystemExit(1)
@@ -0,0 +1,143 @@
+"""Benchmark of the member cleaning on synthetic extracts, see synthetic.py.
+
+python benchmark.py
+python benchmark.py --sizes 10000 100000 1000000 --repeat 3
+python benchmark.py --compare benchmarks/2024-06-01T10-00-00.json
+"""
+import argparse
+import importlib.util
+import json
+import platform
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List
+import numpy as np
+import pandas as pd
+import module
+import pipeline
+import synthetic
+
+
+def time_function(func: Callable, repeat: int) -> List[float]:
+    """Return the wall time in seconds of each run of func."""
+    seconds = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start_time)
+    return seconds
+
+
+def benchmark_size(n_members: int, repeat: int) -> List[dict]:
+    """Time each cleaning function and the whole pipeline on n_members synthetic members.
+    Each function gets the columns it needs, computed in the same order as pipeline.clean.
+
+    :param int n_members: number of members.
+    :param int repeat: runs of each function.
+    :return List[dict]: name, rows and seconds of each benchmark.
+    """
+    dfs = synthetic.generate_extracts(n_members)
+    df_list = [f"extract_{i}.xls" for i in range(len(dfs))]
+    df_ori = module.drop_duplicate_rows(dfs, df_list)
+    df_ = df_ori.rename(columns=lambda c: c.lower().replace(" ", "_"))
+
+    # name: (function, column it adds to df_ for the next functions)
+    steps = {
+        "create_student_name": (lambda: module.create_student_name(df_), "student_name"),
+        "create_student_membership": (
+            lambda: module.create_student_membership(df_), "student_membership"
+        ),
+        "create_student_code": (lambda: module.create_student_code(df_), "student_code"),
+        "clean_phone_number": (lambda: module.clean_phone_number(df_["mobile"]), "mobile"),
+        "is_cpt": (lambda: module.is_cpt(df_), "is_cpt"),
+        "get_student_center": (lambda: module.get_student_center(df_), "student_center"),
+        "get_area": (lambda: module.get_area(df_), "student_area"),
+    }
+    results = []
+
+    def add_result(name: str, rows: int, seconds: List[float]) -> None:
+        results.append(
+            {"size": n_members, "name": name, "rows": rows, "seconds": seconds,
+             "median": float(np.median(seconds))}
+        )
+        print(f"{n_members:>9} {name:<28}{rows:>10}{np.median(seconds):>10.3f}s")
+
+    add_result(
+        "drop_duplicate_rows",
+        sum(len(df) for df in dfs),
+        time_function(lambda: module.drop_duplicate_rows(dfs, df_list), repeat),
+    )
+    for name, (func, col) in steps.items():
+        add_result(name, len(df_), time_function(func, repeat))
+        df_ = df_.assign(**{col: func()})
+
+    add_result(
+        "clean", len(df_ori), time_function(lambda: pipeline.clean(df_ori, backend="pandas"), repeat)
+    )
+    if importlib.util.find_spec("polars") is not None:
+        add_result(
+            "clean_polars",
+            len(df_ori),
+            time_function(lambda: pipeline.clean(df_ori, backend="polars"), repeat),
+        )
+    df_clean = pipeline.clean(df_ori)
+    add_result(
+        "resolve_names", len(df_clean), time_function(lambda: pipeline.resolve_names(df_clean), repeat)
+    )
+    df_clean = pipeline.resolve_names(df_clean)
+    add_result("test", len(df_clean), time_function(lambda: pipeline.test(df_clean), repeat))
+    add_result(
+        "end_to_end",
+        sum(len(df) for df in dfs),
+        time_function(
+            lambda: pipeline.test(
+                pipeline.resolve_names(pipeline.clean(module.drop_duplicate_rows(dfs, df_list)))
+            ),
+            repeat,
+        ),
+    )
+    return results
+
+
+def compare(results: List[dict], baseline_path) -> None:
+    """Print the change of the median time against a previous result file."""
+    baseline = {
+        (result["size"], result["name"]): result["median"]
+        for result in json.loads(Path(baseline_path).read_text())["results"]
+    }
+    print(f"\nCompared to {baseline_path}:")
+    for result in results:
+        key = (result["size"], result["name"])
+        if key in baseline:
+            ratio = result["median"] / baseline[key]
+            print(f"{result['size']:>9} {result['name']:<28}{ratio:>10.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the member cleaning.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="result file, default to benchmarks/<timestamp>.json")
+    parser.add_argument("--compare", help="previous result file to compare with")
+    args = parser.parse_args()
+
+    results = []
+    for n_members in args.sizes:
+        results += benchmark_size(n_members, args.repeat)
+
+    output_path = Path(
+        args.output or Path("benchmarks", f"{datetime.now():%Y-%m-%dT%H-%M-%S}.json")
+    )
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    meta = {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.platform(),
+    }
+    output_path.write_text(json.dumps({"meta": meta, "results": results}, indent=4))
+    print(f"Results saved to {output_path}.")
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,93 @@
+import hashlib
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+def hash_file(filepath) -> str:
+    """Return the SHA-256 of the file bytes.
+
+    :param filepath: path of the file.
+    :return str: hex digest.
+    """
+    return hashlib.sha256(Path(filepath).read_bytes()).hexdigest()
+
+
+def get_key(filepath, skiprows: int, dtypes: dict) -> str:
+    """Return the cache key of an extract.
+    The key is the SHA-256 of the file bytes plus the skiprows setting and the schema,
+    so a renamed or re-downloaded but identical file is still a hit.
+
+    :param filepath: path of the extract.
+    :param int skiprows: rows skipped when parsing the extract.
+    :param dict dtypes: columns and dtypes read from the extract.
+    :return str: cache key.
+    """
+    sha = hash_file(filepath)
+    schema = hashlib.sha256(repr(sorted(dtypes.items())).encode()).hexdigest()[:12]
+    return f"{sha}-skip{skiprows}-{schema}"
+
+
+def load(cache_dir, key: str) -> pd.DataFrame:
+    """Load a parsed extract from the cache.
+
+    :param cache_dir: folder of the cache.
+    :param str key: cache key from get_key.
+    :return pd.DataFrame: the cached DF, None if there is no entry for the key.
+    """
+    path = Path(cache_dir, f"{key}.feather")
+    try:
+        df = pd.read_feather(path)
+    except (FileNotFoundError, ImportError):  # note: feather needs pyarrow
+        return None
+    # mark the entry as recently used for evict
+    try:
+        os.utime(path)
+    except FileNotFoundError:  # note: another worker evicted it after the read, the DF is still valid
+        pass
+    # feather returns None for missing strings, the cleaning expects NaN like read_excel
+    obj_cols = df.select_dtypes("object").columns
+    df[obj_cols] = df[obj_cols].where(df[obj_cols].notna(), np.nan)
+    return df
+
+
+def store(cache_dir, key: str, df: pd.DataFrame) -> None:
+    """Store a parsed extract in the cache.
+    DFs that feather cannot hold (for example a column with mixed types) are not cached.
+
+    :param cache_dir: folder of the cache.
+    :param str key: cache key from get_key.
+    :param pd.DataFrame df: parsed extract.
+    """
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    path = Path(cache_dir, f"{key}.feather")
+    # write to a temp file first, workers may store the same key at the same time
+    tmp_path = Path(cache_dir, f"{key}.{os.getpid()}.tmp")
+    try:
+        df.to_feather(tmp_path)
+    except (TypeError, ValueError, ImportError):
+        tmp_path.unlink(missing_ok=True)
+        return
+    os.replace(tmp_path, path)
+
+
+def evict(cache_dir, max_bytes: int) -> None:
+    """Delete the least recently used entries until the cache is at most max_bytes.
+
+    :param cache_dir: folder of the cache.
+    :param int max_bytes: maximum size of the cache.
+    """
+    entries = []
+    for path in Path(cache_dir).glob("*.feather"):
+        try:
+            entries.append((path, path.stat()))
+        except FileNotFoundError:  # note: evicted by another worker since the glob
+            continue
+    entries.sort(key=lambda entry: entry[1].st_mtime)
+    total = sum(stat.st_size for _, stat in entries)
+    for path, stat in entries:
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= stat.st_size
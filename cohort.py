@@ -0,0 +1,186 @@
+"""Member cohorts by start month, their retention and level progression, for the Member Cohort report.
+The cohorts are kept in output/cohort/cohort_state.pkl and only the cohorts changed by a new month
+are recomputed.
+
+python cohort.py
+python cohort.py --rebuild
+"""
+import argparse
+from pathlib import Path
+from typing import List
+import numpy as np
+import pandas as pd
+import config
+import writers
+
+state_path = Path("output", "cohort", "cohort_state.pkl")
+interval_cols = ["start_date", "end_date", "start_level", "current_level"]
+
+
+def get_intervals(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """Return the contract intervals of the members, indexed by student_code.
+    A contract is a code and start date, its end date and levels are taken from the last row.
+    Contracts without start or end date are left out, they cannot be placed in a cohort.
+
+    :param pd.DataFrame df_clean: cleaned member data.
+    :return pd.DataFrame: start_date, end_date, start_level, current_level and cohort (start month).
+    """
+    intervals = (
+        df_clean.loc[df_clean["start_date"].notna() & df_clean["end_date"].notna()]
+        .drop_duplicates(subset=["student_code", "start_date"], keep="last")
+        .set_index("student_code")[interval_cols]
+        .assign(cohort=lambda df_: df_["start_date"].dt.to_period("M"))
+        .sort_index()
+    )
+    return intervals
+
+
+def get_cohort_stats(intervals: pd.DataFrame) -> tuple:
+    """Count the members of each cohort still active n months after their start month,
+    and aggregate their levels.
+    A member is active from its start month up to its end month, so it is a +1 at period 0
+    and a -1 after its last period, the cumulative sum over the periods is the retention.
+
+    :param pd.DataFrame intervals: from get_intervals.
+    :return tuple: retention counts (cohort x months since start) and levels (per cohort).
+    """
+    start, end = intervals["start_date"], intervals["end_date"]
+    last_period = (
+        (end.dt.year - start.dt.year) * 12 + end.dt.month - start.dt.month
+    ).clip(lower=0)
+    counts = (
+        pd.crosstab(intervals["cohort"], last_period)
+        .reindex(columns=range(last_period.max() + 1 if len(last_period) else 0), fill_value=0)
+        # note: members still active at period k are the ones whose last period is k or later
+        .iloc[:, ::-1].cumsum(axis="columns").iloc[:, ::-1]
+        .rename_axis(index="cohort", columns="period")
+    )
+    levels = (
+        intervals.assign(
+            progress=lambda df_: df_["current_level"] - df_["start_level"],
+            progressed=lambda df_: df_["current_level"] > df_["start_level"],
+        )
+        .groupby("cohort")
+        .agg(
+            members=("start_level", "size"),
+            start_level=("start_level", "mean"),
+            current_level=("current_level", "mean"),
+            progress=("progress", "mean"),
+            share_progressed=("progressed", "mean"),
+        )
+    )
+    return counts, levels
+
+
+def new_state() -> dict:
+    """Return the state of no month."""
+    return {
+        "months": [],
+        "intervals": pd.DataFrame(columns=interval_cols + ["cohort"]).rename_axis("student_code"),
+        "counts": pd.DataFrame(),
+        "levels": pd.DataFrame(),
+    }
+
+
+def update(state: dict, df_clean: pd.DataFrame, month: str) -> List[pd.Period]:
+    """Add the cleaned member data of a month to the state.
+    Only the cohorts with a new or changed contract are recomputed, the others are kept as is.
+    Months must be added in order, see build.
+
+    :param dict state: from new_state or a previous update, updated in place.
+    :param pd.DataFrame df_clean: cleaned member data of the month.
+    :param str month: the month, like 2024-05.
+    :return List[pd.Period]: recomputed cohorts.
+    """
+    new = get_intervals(df_clean)
+    old = state["intervals"]
+    # note: a contract changed if its row is not in the state, compared by hash
+    old_hashes = pd.util.hash_pandas_object(old.reset_index(), index=False)
+    new_hashes = pd.util.hash_pandas_object(new.reset_index(), index=False)
+    changed = ~new_hashes.isin(old_hashes).to_numpy()
+    cohorts = sorted(new.loc[changed, "cohort"].unique())
+
+    intervals = (
+        pd.concat([old, new.loc[changed]] if len(old) else [new.loc[changed]])
+        .reset_index()
+        .drop_duplicates(subset=["student_code", "start_date"], keep="last")
+        .set_index("student_code")
+        .sort_index()
+    )
+    counts, levels = get_cohort_stats(intervals.loc[intervals["cohort"].isin(cohorts)])
+
+    def replace_cohorts(df: pd.DataFrame, df_cohorts: pd.DataFrame) -> pd.DataFrame:
+        return pd.concat([df.loc[~df.index.isin(cohorts)], df_cohorts]).sort_index()
+
+    state["intervals"] = intervals
+    # note: a cohort has no member in the periods after its longest contract
+    counts = replace_cohorts(state["counts"], counts).fillna(0).astype(int)
+    # the periods after the longest contract of all cohorts are dropped, it can get shorter
+    has_members = (counts != 0).any().to_numpy()
+    counts = counts.iloc[:, : np.flatnonzero(has_members).max() + 1 if has_members.any() else 0]
+    state["counts"] = counts.rename_axis(index="cohort", columns="period")
+    state["levels"] = replace_cohorts(state["levels"], levels)
+    state["months"] = sorted(set(state["months"]) | {month})
+    return cohorts
+
+
+def get_retention(state: dict, rate: bool = False) -> pd.DataFrame:
+    """Return the retention matrix, cohort x months since start.
+    Periods after the latest month of the state are not known yet and are NaN.
+
+    :param dict state: cohort state.
+    :param bool rate: share of the cohort instead of number of members.
+    :return pd.DataFrame: retention.
+    """
+    counts = state["counts"]
+    as_of = pd.Period(max(state["months"]), "M")
+    periods_known = np.array([(as_of - cohort).n for cohort in counts.index])
+    retention = counts.where(counts.columns.to_numpy() <= periods_known[:, None])
+    if rate:
+        retention = retention.div(counts[0], axis="index")
+    return retention
+
+
+def load_state() -> dict:
+    """Load the cohort state, a new state if there is none."""
+    return pd.read_pickle(state_path) if state_path.exists() else new_state()
+
+
+def save_state(state: dict) -> None:
+    """Save the cohort state."""
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    pd.to_pickle(state, state_path)
+
+
+def build(months: List[str], state: dict = None) -> dict:
+    """Add the months of output/ which are not in the state yet.
+    If a month is older than the latest month of the state, the state is rebuilt from scratch,
+    so that the latest data of a contract always wins.
+
+    :param List[str] months: month folders under output/.
+    :param dict state: cohort state, None for a new one.
+    :return dict: updated state.
+    """
+    state = new_state() if state is None else state
+    new_months = sorted(set(months) - set(state["months"]))
+    if state["months"] and new_months and new_months[0] < max(state["months"]):
+        state, new_months = new_state(), sorted(set(months) | set(state["months"]))
+    for month in new_months:
+        df_clean = writers.read(Path("output", month), config.output_name)
+        cohorts = update(state, df_clean, month)
+        print(f"{month}: {len(cohorts)} cohorts updated.")
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Member cohort retention and level progression.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all months")
+    args = parser.parse_args()
+
+    months = sorted({path.parent.name for path in Path("output").glob(f"*/{config.output_name}.*")})
+    state = build(months, None if args.rebuild else load_state())
+    save_state(state)
+    get_retention(state).to_csv(state_path.parent / "retention.csv")
+    get_retention(state, rate=True).to_csv(state_path.parent / "retention_rate.csv")
+    state["levels"].to_csv(state_path.parent / "levels.csv")
+    print(f"Cohorts saved to {state_path.parent}.")
@@ -1,4 +1,46 @@
+import csv
+from pathlib import Path
+
 month = "2024-05"  # note: to find attendance data folder for current month
+n_workers = None  # note: processes used to read the extracts, None means one per CPU
+cache_dir = "cache"  # note: parsed extracts are cached here, None to disable
+cache_max_bytes = 500 * 1024 ** 2  # note: least recently used extracts are deleted above this size
+backend = "pandas"  # note: pandas or polars, the cleaning as a polars lazy query (needs polars and pyarrow), see polars_backend.py
+chunksize = None  # note: parse and clean the extracts in chunks of this many rows to bound memory, None to read them whole
+drop_duplicate_rows = True  # note: drop rows exported more than once right after loading
+output_name = "coco_member"  # note: output file name without extension
+output_formats = ["xlsx"]  # note: any of xlsx, parquet, feather, csv (parquet and feather need pyarrow)
+validation_sample = None  # note: validate this many rows only (whole codes), None for all rows
+store_path = None  # note: sqlite file to also save every month to, like output/members.sqlite, see store.py
+write_delta = False  # note: also write the changes since the previous month to output/<month>/coco_member_delta, see delta.py
+compact = False  # note: store the low cardinality columns as categorical, see module.compact
+trace_memory = False  # note: exact peak memory per stage in run_report.json, slows the run down
+profile_stage = None  # note: name of a stage (load, clean, resolve_names, test, save) to run with cProfile
+
+# columns of the coco extract used by the cleaning, other columns are skipped when reading
+# note: update if CAD changes the export
+extract_dtypes = {
+    "Last Name": "object",
+    "First Name": "object",
+    "Student Code": "int64",
+    "Date of Birth": "datetime64[ns]",
+    "Mobile": "object",
+    "Email": "object",
+    "Service Type": "object",
+    "Consultant": "object",
+    "Start Date": "datetime64[ns]",
+    "End Date": "datetime64[ns]",
+    "Start Level": "float64",
+    "Current Level": "float64",
+    "Contract Status": "object",
+}
+extract_date_columns = ["Date of Birth", "Start Date", "End Date"]
+
+# values of the low cardinality columns, used as categories in compact mode
+# note: update if CAD adds a service type or contract status
+memberships = ["Deluxe", "Go", "Street Talk", "VIP"]
+service_types = ["Standard", "VIP"]
+contract_statuses = ["Active-Valid", "InActive-Valid", "Invalid", "Promo-Invalid", "Future"]
 
 # map centre here
 # note: update if there are new centers
@@ -19,3 +61,23 @@ map_areas = {
     "Corporate": ["Corporate"],
     "Online Center": ["Online Center"],
 }
+
+# consultants of corporate (CPT) members
+# note: update if there are new corporate consultants
+cpt_consultants = [
+    "PUTRI HANDAYANI KUN ANDIKA",
+    "ZULFADLI ZULFADLI",
+    "DIREDJA DENNY DARMAWAN",
+    "LIMUEL DONNA",
+    "AMALIA, S.T RINA",
+    "TEDJOKOESOEMO PUTRA PRATAMA",
+    "AIDIL MUNAWAR",
+    "AMALIA SYIFA",
+    "DIREDJA DENNY",
+]
+
+# center of each consultant, used for members without center in their name
+# note: update consultant_centers.csv if there are new consultants, with the date they are added
+consultant_table = Path(__file__).with_name("consultant_centers.csv")
+with open(consultant_table, newline="", encoding="utf-8") as f:
+    map_consultant = {row["consultant"]: row["center"] for row in csv.DictReader(f)}
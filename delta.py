@@ -0,0 +1,104 @@
+"""Changes of the member data since the previous month: added, removed and changed members.
+
+python delta.py 2024-05
+"""
+import argparse
+from pathlib import Path
+from typing import List
+import pandas as pd
+import config
+import writers
+
+
+def get_previous_month(month: str) -> str:
+    """Return the month before, like 2024-04 for 2024-05."""
+    return str(pd.Period(month, "M") - 1)
+
+
+def get_delta(
+    df_previous: pd.DataFrame, df_current: pd.DataFrame, key: str = "student_code"
+) -> pd.DataFrame:
+    """Compare two months of cleaned member data by key with one hash join.
+    Missing values are equal to each other.
+
+    :param pd.DataFrame df_previous: cleaned member data of the previous month.
+    :param pd.DataFrame df_current: cleaned member data of the month.
+    :param str key: column identifying a member, unique in both months.
+    :return pd.DataFrame: the members which are added, removed or changed, with change,
+        changed_columns (comma separated) and their data of the month (of the previous month
+        for the removed members).
+    """
+    columns = [col for col in df_current.columns if col != key and col in df_previous.columns]
+
+    def select(df: pd.DataFrame) -> pd.DataFrame:
+        # note: categories of compact mode can differ between months, compare the values
+        categorical = [col for col in columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+        return df[[key] + columns].astype({col: object for col in categorical})
+
+    merged = select(df_previous).merge(
+        select(df_current), on=key, how="outer", suffixes=("_previous", ""), indicator=True
+    )
+    both = merged["_merge"] == "both"
+    removed = merged["_merge"] == "left_only"
+    is_changed = pd.DataFrame(index=merged.index[both])
+    for col in columns:
+        previous, current = merged.loc[both, f"{col}_previous"], merged.loc[both, col]
+        is_changed[col] = ~((previous == current) | (previous.isna() & current.isna()))
+        # data of the month, of the previous month for the removed members
+        merged[col] = merged[col].where(~removed, merged[f"{col}_previous"])
+
+    delta = (
+        merged[[key] + columns]
+        .assign(
+            change=merged["_merge"].map(
+                {"left_only": "removed", "right_only": "added", "both": "changed"}
+            ).astype(str),
+            # note: names of the changed columns, joined with the dot of the mask and the names
+            changed_columns=is_changed.dot(pd.Index(columns) + ",").str.rstrip(","),
+        )
+        .loc[lambda df_: (df_["change"] != "changed") | (df_["changed_columns"].fillna("") != "")]
+        .sort_values(["change", key])
+        .reset_index(drop=True)
+    )
+    return delta[[key, "change", "changed_columns"] + columns]
+
+
+def write_delta(
+    df_clean: pd.DataFrame, month: str, formats: List[str] = None, output_dir="output"
+) -> pd.DataFrame:
+    """Write <output_dir>/<month>/coco_member_delta.<format> against the previous month.
+    The previous month is read from its fastest output format, see writers.read.
+
+    :param pd.DataFrame df_clean: cleaned member data of the month.
+    :param str month: the month, like 2024-05.
+    :param List[str] formats: output formats, default to config.output_formats.
+    :param output_dir: folder of the month outputs.
+    :return pd.DataFrame: delta, None if the previous month has no output.
+    """
+    previous_month = get_previous_month(month)
+    try:
+        df_previous = writers.read(Path(output_dir, previous_month), config.output_name)
+    except FileNotFoundError:
+        print(f"No output of {previous_month}, no delta written.")
+        return None
+
+    delta = get_delta(df_previous, df_clean)
+    writers.write(
+        delta, Path(output_dir, month), f"{config.output_name}_delta",
+        formats or config.output_formats,
+    )
+    counts = delta["change"].value_counts()
+    print(
+        f"Delta to {previous_month}: {counts.get('added', 0)} added, "
+        f"{counts.get('removed', 0)} removed, {counts.get('changed', 0)} changed."
+    )
+    return delta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Changes of the members since the previous month.")
+    parser.add_argument("month", nargs="?", default=config.month, help="month like 2024-05")
+    parser.add_argument("--formats", nargs="+", help="default to config.output_formats")
+    args = parser.parse_args()
+    df_clean = writers.read(Path("output", args.month), config.output_name)
+    write_delta(df_clean, args.month, args.formats)
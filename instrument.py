@@ -0,0 +1,108 @@
+"""Timing and memory of the pipeline stages, saved as a run report next to the output."""
+import cProfile
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # note: not available on Windows
+    resource = None
+
+
+def get_max_rss_mb(children: bool = False) -> float:
+    """Return the peak resident memory of this process so far, None if it is not available.
+    It is a high-water mark, it never goes down.
+
+    :param bool children: peak of the largest finished child process instead,
+        like the workers of the loader.
+    :return float: MB.
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    max_rss = resource.getrusage(who).ru_maxrss
+    # note: bytes on macOS, kilobytes on Linux
+    return max_rss / 1024 ** 2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def new_report(month: str) -> dict:
+    """Return an empty run report of a month."""
+    return {"month": month, "started_at": datetime.now().isoformat(), "stages": []}
+
+
+@contextmanager
+def stage(
+    report: dict,
+    name: str,
+    rows_in: int = None,
+    trace_memory: bool = False,
+    profile_path=None,
+):
+    """Record wall time and memory of the code inside the with block as one stage.
+    Set record["rows_out"] inside the block to record the rows of the result.
+    max_rss_mb is the high-water mark of the process memory at the end of the stage, not the memory
+    of the stage: it never goes down. rss_increase_mb is how much the stage raised it, 0 for
+    a stage which stayed under the peak of the previous ones. children_max_rss_mb and
+    children_rss_increase_mb are the same for the largest finished child process, the worker
+    processes of the loader parse the extracts when n_workers is not 1.
+    peak_memory_mb is the exact peak of the stage, measured with tracemalloc, which slows
+    python heavy code (like xlrd parsing) down a lot and does not see the worker processes.
+
+    :param dict report: run report from new_report, the stage is appended to report["stages"].
+    :param str name: stage name.
+    :param int rows_in: rows given to the stage.
+    :param bool trace_memory: measure the exact peak memory of the stage with tracemalloc.
+    :param profile_path: if given, run cProfile on the stage and save the stats there.
+    :yield dict: record of the stage.
+    """
+    record = {"name": name, "rows_in": rows_in, "rows_out": None}
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile() if profile_path is not None else None
+
+    rss_before = get_max_rss_mb()
+    children_rss_before = get_max_rss_mb(children=True)
+    start_time = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record["seconds"] = time.perf_counter() - start_time
+        record["max_rss_mb"] = get_max_rss_mb()
+        record["children_max_rss_mb"] = get_max_rss_mb(children=True)
+        if rss_before is not None:
+            record["rss_increase_mb"] = record["max_rss_mb"] - rss_before
+            record["children_rss_increase_mb"] = (
+                record["children_max_rss_mb"] - children_rss_before
+            )
+        if trace_memory:
+            record["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        if started_tracing:
+            tracemalloc.stop()
+        if profiler is not None:
+            profiler.dump_stats(profile_path)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+        report["stages"].append(record)
+
+
+def save_report(report: dict, output_path) -> None:
+    """Save the run report to output_path/run_report.json.
+
+    :param dict report: run report.
+    :param output_path: output folder of the month.
+    """
+    report["total_seconds"] = sum(record["seconds"] for record in report["stages"])
+    Path(output_path).mkdir(parents=True, exist_ok=True)
+    Path(output_path, "run_report.json").write_text(json.dumps(report, indent=4))
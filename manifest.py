@@ -0,0 +1,70 @@
+"""Build manifest of a month output.
+The manifest records the hash of every input extract and a fingerprint of the cleaning rules,
+the output only needs to be recomputed when one of them changes.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import List
+import cache
+import config
+
+# files holding the cleaning, validation and output rules, a change in any of them invalidates every output
+rule_files = ["pipeline.py", "module.py", "polars_backend.py", "writers.py", "tests.py"]
+
+
+def get_rules_fingerprint() -> str:
+    """Return the fingerprint of the config mappings and the cleaning code.
+
+    :return str: hex digest.
+    """
+    rules = {
+        "centers": config.centers,
+        "map_areas": config.map_areas,
+        "cpt_consultants": sorted(config.cpt_consultants),
+        "map_consultant": sorted(config.map_consultant.items()),
+        "extract_dtypes": config.extract_dtypes,
+        "extract_date_columns": config.extract_date_columns,
+    }
+    sha = hashlib.sha256(json.dumps(rules, sort_keys=True).encode())
+    for filename in rule_files:
+        sha.update(Path(__file__).with_name(filename).read_bytes())
+    return sha.hexdigest()
+
+
+def build_manifest(df_list: list) -> dict:
+    """Build the manifest of a month from its extracts and the current rules.
+
+    :param list df_list: paths of the extracts.
+    :return dict: manifest.
+    """
+    return {
+        "inputs": {Path(filepath).name: cache.hash_file(filepath) for filepath in df_list},
+        "rules": get_rules_fingerprint(),
+    }
+
+
+def is_up_to_date(output_path, manifest: dict, output_files: List[str]) -> bool:
+    """Check whether the output was built from the same inputs and rules.
+
+    :param output_path: output folder of the month.
+    :param dict manifest: manifest of the current inputs and rules.
+    :param List[str] output_files: files that must exist in output_path.
+    :return bool: True if nothing has changed since the last build.
+    """
+    try:
+        stored = json.loads(Path(output_path, "manifest.json").read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    return stored == manifest and all(
+        Path(output_path, filename).exists() for filename in output_files
+    )
+
+
+def write_manifest(output_path, manifest: dict) -> None:
+    """Write the manifest next to the output, after the output is saved.
+
+    :param output_path: output folder of the month.
+    :param dict manifest: manifest of the inputs and rules used for the output.
+    """
+    Path(output_path, "manifest.json").write_text(json.dumps(manifest, indent=4))
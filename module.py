@@ -1,27 +1,256 @@
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
 import pandas as pd
 import numpy as np
+import xlrd
+from pandas.io.parsers import TextParser
+import cache
 import config
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 
 
-def load_multiple_dfs(df_list: list) -> pd.DataFrame:
+def parse_extract(filepath, skiprows: int = 6) -> pd.DataFrame:
+    """Parse one Coco extract with the schema in config.extract_dtypes.
+    Only the declared columns are read, with fixed dtypes.
+
+    :param filepath: path of the .xls extract.
+    :param int skiprows: rows of report header above the table.
+    :return pd.DataFrame: the extract.
+    :raises ValueError: if a declared column is not in the extract.
+    """
+    read_dtypes = {
+        col: dtype
+        for col, dtype in config.extract_dtypes.items()
+        if col not in config.extract_date_columns
+    }
+    df = pd.read_excel(
+        filepath,
+        skiprows=skiprows,
+        usecols=lambda col: col in config.extract_dtypes,
+        dtype=read_dtypes,
+    )
+
+    missing = [col for col in config.extract_dtypes if col not in df.columns]
+    if missing:
+        raise ValueError(
+            f"{filepath} does not have columns {missing}, check config.extract_dtypes."
+        )
+    for col in config.extract_date_columns:
+        df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def read_extract(filepath, skiprows: int = 6, cache_dir=None) -> pd.DataFrame:
+    """Read one Coco extract, skipping the report header.
+    If cache_dir is given, the parsed extract is taken from / saved to the cache.
+
+    :param filepath: path of the .xls extract.
+    :param int skiprows: rows of report header above the table.
+    :param cache_dir: folder of the parsed extract cache, None to always parse.
+    :return pd.DataFrame: the extract.
+    """
+    if cache_dir is None:
+        return parse_extract(filepath, skiprows)
+
+    key = cache.get_key(filepath, skiprows, config.extract_dtypes)
+    df = cache.load(cache_dir, key)
+    if df is None:
+        df = parse_extract(filepath, skiprows)
+        cache.store(cache_dir, key, df)
+    return df
+
+
+def load_multiple_dfs(
+    df_list: list,
+    n_workers: int = None,
+    cache_dir=None,
+    cache_max_bytes: int = None,
+    drop_duplicates: bool = False,
+) -> pd.DataFrame:
     """Load all DF listed in the df_list and return them as one DF.
+    Files are parsed in a process pool, but the DFs are concatted in the order of df_list
+    so that drop_duplicates(keep="first") afterwards always keeps the same rows.
 
     :param list df_list: paths of DFs.
+    :param int n_workers: number of worker processes, default to the number of CPUs.
+        Use 1 to load the files one by one in this process.
+    :param cache_dir: folder of the parsed extract cache, None to disable the cache.
+    :param int cache_max_bytes: size limit of the cache, None for no limit.
+    :param bool drop_duplicates: drop exact duplicate rows, see drop_duplicate_rows.
     :return pd.DataFrame: concatted DF.
     """
-    dfs = []
-    for filepath in df_list:
-        df = pd.read_excel(filepath, skiprows=6)
-        dfs.append(df)
+    read = partial(read_extract, cache_dir=cache_dir)
+    n_workers = min(n_workers or os.cpu_count() or 1, len(df_list))
+    if n_workers <= 1:
+        dfs = [read(filepath) for filepath in df_list]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            dfs = list(executor.map(read, df_list))
+
+    if cache_dir is not None and cache_max_bytes is not None:
+        cache.evict(cache_dir, cache_max_bytes)
+    if drop_duplicates:
+        return drop_duplicate_rows(dfs, df_list)
     return pd.concat(dfs, ignore_index=True)
 
 
-def create_student_name(df_: pd.DataFrame) -> pd.Series:
+def drop_duplicate_rows(dfs: List[pd.DataFrame], df_list: list) -> pd.DataFrame:
+    """Concat the DFs and drop exact duplicate rows, keeping the first.
+    The same member is exported many times because each extract is downloaded multiple times,
+    dropping them here means the cleaning only runs on unique rows.
+    The number of rows dropped from each file is in attrs["duplicates_removed"].
+
+    :param List[pd.DataFrame] dfs: DFs in concat order.
+    :param list df_list: paths of the DFs.
+    :return pd.DataFrame: concatted DF without duplicate rows, index as in pd.concat.
+    """
+    df = pd.concat(dfs, ignore_index=True)
+    is_duplicate = pd.util.hash_pandas_object(df, index=False).duplicated().to_numpy()
+
+    source = np.repeat(np.arange(len(dfs)), [len(df_) for df_ in dfs])
+    count_removed = np.bincount(source[is_duplicate], minlength=len(dfs))
+
+    df = df.loc[~is_duplicate]
+    df.attrs["duplicates_removed"] = {
+        Path(filepath).name: int(count) for filepath, count in zip(df_list, count_removed)
+    }
+    return df
+
+
+def parse_cell(value, cell_type: int, datemode: int):
+    """Convert an xlrd cell to the python value pandas read_excel gives."""
+    if cell_type == xlrd.XL_CELL_DATE:
+        try:
+            value = xlrd.xldate.xldate_as_datetime(value, datemode)
+        except OverflowError:
+            return value
+        # note: excel has no time type, dates on the epoch are times
+        if value.timetuple()[:3] == ((1904, 1, 1) if datemode else (1899, 12, 31)):
+            value = value.time()
+    elif cell_type == xlrd.XL_CELL_ERROR:
+        value = np.nan
+    elif cell_type == xlrd.XL_CELL_BOOLEAN:
+        value = bool(value)
+    elif cell_type == xlrd.XL_CELL_NUMBER and math.isfinite(value) and int(value) == value:
+        value = int(value)
+    return value
+
+
+def iter_extract_chunks(filepath, chunksize: int, skiprows: int = 6) -> Iterator[pd.DataFrame]:
+    """Parse one Coco extract in chunks of rows, with the same result as parse_extract.
+    xlrd cannot stream a sheet, but only the cells of one chunk are converted to python values
+    and parsed at once, the sheet is released when the file is done.
+
+    :param filepath: path of the .xls extract.
+    :param int chunksize: rows per chunk.
+    :param int skiprows: rows of report header above the table.
+    :yield pd.DataFrame: chunks of the extract, indexed from 0 within the file.
+    :raises ValueError: if a declared column is not in the extract.
+    """
+    read_dtypes = {
+        col: dtype
+        for col, dtype in config.extract_dtypes.items()
+        if col not in config.extract_date_columns
+    }
+    workbook = xlrd.open_workbook(filepath, on_demand=True)
+    try:
+        sheet = workbook.sheet_by_index(0)
+        header = sheet.row_values(skiprows)
+        col_idx = {}
+        for idx, col in enumerate(header):
+            if col in config.extract_dtypes:
+                col_idx.setdefault(col, idx)
+        missing = [col for col in config.extract_dtypes if col not in col_idx]
+        if missing:
+            raise ValueError(
+                f"{filepath} does not have columns {missing}, check config.extract_dtypes."
+            )
+
+        cols = sorted(col_idx, key=col_idx.get)
+        n_parsed = 0
+        for start in range(skiprows + 1, sheet.nrows, chunksize):
+            rows = []
+            for row_idx in range(start, min(start + chunksize, sheet.nrows)):
+                values, types = sheet.row_values(row_idx), sheet.row_types(row_idx)
+                rows.append(
+                    [parse_cell(values[col_idx[col]], types[col_idx[col]], workbook.datemode)
+                     for col in cols]
+                )
+            # note: TextParser is what read_excel uses, so the missing values and dtypes are the same
+            chunk = TextParser([cols] + rows, header=0, dtype=read_dtypes).read()
+            for col in config.extract_date_columns:
+                chunk[col] = pd.to_datetime(chunk[col])
+            # note: blank rows are skipped by TextParser, count the parsed rows instead
+            chunk.index += n_parsed
+            n_parsed += len(chunk)
+            yield chunk
+    finally:
+        workbook.release_resources()
+
+
+def is_first_seen(df: pd.DataFrame, seen: set, subset: list = None) -> np.ndarray:
+    """Return True for the rows whose key is not in seen nor earlier in df, and add their keys to seen.
+    Call it on consecutive chunks with the same seen to get drop_duplicates(keep="first")
+    over all chunks, while only the 64 bit hash of each kept key is held in memory.
+
+    :param pd.DataFrame df: chunk.
+    :param set seen: hashes of the keys of the previous chunks.
+    :param list subset: key columns, None for the whole row.
+    :return np.ndarray: mask of the rows to keep.
+    """
+    hashes = pd.util.hash_pandas_object(
+        df if subset is None else df[subset], index=False
+    ).to_numpy()
+    is_first = ~pd.Series(hashes).duplicated().to_numpy()
+    is_first &= np.fromiter((h not in seen for h in hashes.tolist()), bool, len(hashes))
+    seen.update(hashes[is_first].tolist())
+    return is_first
+
+
+def apply_unique(data, func, memo: dict = None) -> pd.Series:
+    """Apply func to the unique values of data only and broadcast the result back.
+    Member data repeats a lot (few consultants and service types, same member in many extracts),
+    so the string transforms only need to run once per unique value.
+
+    :param data: pd.Series, or pd.DataFrame to use the unique rows.
+    :param func: transform taking the unique values (same type as data) and returning one result each.
+    :param dict memo: results of previous calls with the same func, keyed by value (tuple for DF).
+        It is updated in place, pass the same dict to reuse the results across months.
+    :return pd.Series: result for each row of data.
+    """
+    if isinstance(data, pd.DataFrame):
+        codes = data.groupby(list(data.columns), dropna=False, sort=False).ngroup().to_numpy()
+        _, first_idx = np.unique(codes, return_index=True)
+        uniques = data.iloc[first_idx].reset_index(drop=True)
+        keys = list(uniques.itertuples(index=False, name=None))
+    else:
+        codes, unique_values = pd.factorize(data, use_na_sentinel=False)
+        uniques = pd.Series(unique_values, name=data.name)
+        keys = list(unique_values)
+
+    memo = {} if memo is None else memo
+    missing = [i for i, key in enumerate(keys) if key not in memo]
+    if missing:
+        results = np.asarray(func(uniques.iloc[missing]))
+        memo.update(zip((keys[i] for i in missing), results))
+
+    unique_results = pd.Series([memo[key] for key in keys]).to_numpy()
+    return pd.Series(unique_results[codes], index=data.index)
+
+
+def create_student_name(df_: pd.DataFrame, memo: dict = None) -> pd.Series:
     """Create student name from first and last name.
     Coco name is started from last, then first.
     """
-    return (df_["last_name"] + " " + df_["first_name"]).str.title()
+    return apply_unique(
+        df_[["last_name", "first_name"]],
+        lambda names: (names["last_name"] + " " + names["first_name"]).str.title(),
+        memo,
+    )
 
 
 def create_student_code(df_: pd.DataFrame) -> pd.Series:
@@ -44,7 +273,7 @@ def create_student_code(df_: pd.DataFrame) -> pd.Series:
     return df_["student_membership"] + " " + df_["student_code"].astype(int).astype(str)
 
 
-def create_student_membership(df_: pd.DataFrame) -> pd.Series:
+def create_student_membership(df_: pd.DataFrame, memo: dict = None) -> pd.Series:
     """
         Create series marking student membership type.
         Standard Deluxe can join online and offline class.
@@ -53,221 +282,186 @@ def create_student_membership(df_: pd.DataFrame) -> pd.Series:
 
     Args:
         df (pd.DataFrame)
+        memo (dict): see apply_unique
 
     Returns:
         memberships
     """
 
-    membership_contains_std = df_["service_type"] == "Standard"
-    membership_contains_vip = df_["service_type"] == "VIP"
-    name_contains_dlx = (
-        df_["student_name"]
-        .str.upper()
-        .str.contains("(DLX", regex=False, na=False)
-    )
-    name_contains_go = (
-        df_["student_name"]
-        .str.upper()
-        .str.contains("(GO", regex=False, na=False)
-    )
-    name_contains_st = (
-        df_["student_name"]
-        .str.upper()
-        .str.contains("STREET TALK|STREETTALK", regex=True, na=False)
-    )
-    mask_deluxe_1 = (~name_contains_go) & membership_contains_std
-    mask_deluxe_2 = (~name_contains_go) & name_contains_dlx
-
-    conditions = [
-        name_contains_st,
-        name_contains_go,
-        mask_deluxe_1,
-        mask_deluxe_2,
-        membership_contains_vip,
-    ]
-    choices = ["Street Talk", "Go", "Deluxe", "Deluxe", "VIP"]
-    memberships = np.select(conditions, choices, default="NONE")
-
-    # assert that all memberships are specified
-    assert not (memberships == "NONE").sum(), "Some memberships are not specified."
-
-    return memberships
-
-
-def is_cpt(df_: pd.DataFrame) -> pd.Series:
+    def get_memberships(df_: pd.DataFrame) -> np.ndarray:
+        membership_contains_std = df_["service_type"] == "Standard"
+        membership_contains_vip = df_["service_type"] == "VIP"
+        name_contains_dlx = (
+            df_["student_name"]
+            .str.upper()
+            .str.contains("(DLX", regex=False, na=False)
+        )
+        name_contains_go = (
+            df_["student_name"]
+            .str.upper()
+            .str.contains("(GO", regex=False, na=False)
+        )
+        name_contains_st = (
+            df_["student_name"]
+            .str.upper()
+            .str.contains("STREET TALK|STREETTALK", regex=True, na=False)
+        )
+        mask_deluxe_1 = (~name_contains_go) & membership_contains_std
+        mask_deluxe_2 = (~name_contains_go) & name_contains_dlx
+
+        conditions = [
+            name_contains_st,
+            name_contains_go,
+            mask_deluxe_1,
+            mask_deluxe_2,
+            membership_contains_vip,
+        ]
+        choices = ["Street Talk", "Go", "Deluxe", "Deluxe", "VIP"]
+        memberships = np.select(conditions, choices, default="NONE")
+
+        # assert that all memberships are specified
+        assert not (memberships == "NONE").sum(), "Some memberships are not specified."
+
+        return memberships
+
+    return apply_unique(df_[["service_type", "student_name"]], get_memberships, memo)
+
+
+def is_cpt(df_: pd.DataFrame, memo: dict = None) -> pd.Series:
     """
     Determine whether a student is a CPT student or not
     based on consultants and ID.
 
     :param pd.DataFrame df_: Dataframe.
+    :param dict memo: see apply_unique.
     :return pd.Series: Boolean.
     """
 
-    cpt_consultants = [
-        "PUTRI HANDAYANI KUN ANDIKA",
-        "ZULFADLI ZULFADLI",
-        "DIREDJA DENNY DARMAWAN",
-        "LIMUEL DONNA",
-        "AMALIA, S.T RINA",
-        "TEDJOKOESOEMO PUTRA PRATAMA",
-        "AIDIL MUNAWAR",
-        "AMALIA SYIFA",
-        "DIREDJA DENNY",
-    ]
-    # member have corporate consultant
-    consultant_cpt = df_["consultant"].str.upper().isin(cpt_consultants)
-    # member have CPT identifier in their name
-    id_contains_cpt = (
-        df_["student_name"].str.upper().str.contains(r"\WCPT\W", regex=True, na=False)
-    )
-    is_cpt = consultant_cpt | id_contains_cpt
-    return is_cpt
+    def get_is_cpt(df_: pd.DataFrame) -> pd.Series:
+        # member have corporate consultant
+        consultant_cpt = df_["consultant"].str.upper().isin(config.cpt_consultants)
+        # member have CPT identifier in their name
+        id_contains_cpt = (
+            df_["student_name"].str.upper().str.contains(r"\WCPT\W", regex=True, na=False)
+        )
+        return consultant_cpt | id_contains_cpt
+
+    return apply_unique(df_[["consultant", "student_name"]], get_is_cpt, memo)
+
 
+def normalize_consultants(consultants: pd.Series, sort_words: bool = False) -> pd.Series:
+    """Return the consultant names without extra spacing and punctuation, the center marker is kept,
+    so that "ABDULBAR SOEDIBYO (BSD)FADHIEL" and "ABDULBAR, SOEDIBYO ( BSD ) FADHIEL" are the same.
 
-def get_member_center_from_consultant(consultant: pd.Series) -> pd.Series:
+    :param pd.Series consultants: consultant names.
+    :param bool sort_words: also drop the center marker and sort the words,
+        so that "SOEDIBYO FADHIEL ABDULBAR" is the same as "ABDULBAR SOEDIBYO FADHIEL".
+    :return pd.Series: normalized names.
+    """
+    names = consultants.str.upper().str.replace(r"\(\s*([^)]*?)\s*\)", r" (\1) ", regex=True)
+    if sort_words:
+        names = names.str.replace(r"\([^)]*\)", " ", regex=True)
+    words = names.str.replace(r"[^A-Z0-9()]+", " ", regex=True).str.split()
+    if sort_words:
+        words = words.map(sorted, na_action="ignore")
+    return words.map(" ".join, na_action="ignore")
+
+
+def get_unambiguous_centers(keys: pd.Series, centers: pd.Series) -> dict:
+    """Return the center of each key, the keys of table rows with different centers are left out."""
+    n_centers = centers.groupby(keys.to_numpy()).nunique()
+    first_center = centers.groupby(keys.to_numpy()).first()
+    return first_center[n_centers == 1].to_dict()
+
+
+@lru_cache(maxsize=None)
+def get_consultant_index() -> Tuple[dict, dict, re.Pattern, dict]:
+    """Build the consultant lookups from config.map_consultant once.
+    A normalized name of table rows with different centers is ambiguous and left out,
+    these consultants are only found by their exact name.
+
+    :return Tuple[dict, dict, re.Pattern, dict]: center of each consultant, center of each
+        normalized consultant, pattern capturing a center marker like (PP),
+        center of each consultant normalized with sorted words.
+    """
+    consultants = pd.Series(list(config.map_consultant), dtype=object)
+    centers = pd.Series(list(config.map_consultant.values()), dtype=object)
+    normalized = get_unambiguous_centers(normalize_consultants(consultants), centers)
+    sorted_words = get_unambiguous_centers(normalize_consultants(consultants, True), centers)
+    marker_pattern = re.compile(rf'\(\s*({"|".join(config.centers)})\s*\)')
+    return dict(config.map_consultant), normalized, marker_pattern, sorted_words
+
+
+def resolve_consultant_centers(consultants: pd.Series) -> pd.Series:
+    """Return the center of each consultant: from the consultant table,
+    else from the table by normalized name, else from the center marker in the name,
+    else from the table by the words of the name in any order.
+
+    :param pd.Series consultants: uppercase consultant names.
+    :return pd.Series: center, NaN if not found.
+    """
+    exact, normalized, marker_pattern, sorted_words = get_consultant_index()
+    centers = consultants.map(exact)
+    missing = centers.isna() & consultants.notna()
+    centers[missing] = normalize_consultants(consultants[missing]).map(normalized)
+    missing = centers.isna() & consultants.notna()
+    centers[missing] = consultants[missing].str.extract(marker_pattern, expand=False)
+    missing = centers.isna() & consultants.notna()
+    centers[missing] = normalize_consultants(consultants[missing], True).map(sorted_words)
+    return centers
+
+
+def get_member_center_from_consultant(consultant: pd.Series, memo: dict = None) -> pd.Series:
     """
-    ! NEED TO DEBUG WHY SOME ARE NOT MAPPED
     Get member center from their consultant's center.
     Useful for members who does not have center identifier.
+    The lookup runs once per unique consultant, see resolve_consultant_centers.
 
     :param pd.Series consultant: Consultant of that member.
+    :param dict memo: see apply_unique.
     :return pd.Series: The consultant's center.
     """
+    return apply_unique(consultant, resolve_consultant_centers, memo)
 
-    map_consultant = {
-        "SALAWATI (PP) NATALIA JOPHINA": "PP",
-        "YAN FIRSUS TUMANGGOR (KK) SAMUEL": "KK",
-        "(DG) ABIMANYU ABDUL KARIM": "DG",
-        "RAVEN RIZQULLAH (CBB) MUHAMMAD": "CBB",
-        "TOMBOKAN NATANIA ATHENA": "PP",
-        "(DG) SALSHABILA SUDRAJAT ALTIARA ASRA": "DG",
-        "ABDULBAR SOEDIBYO (BSD)FADHIEL": "BSD",
-        "YOLANDHA (LW) NADYA PUSPA": "LW",
-        "LELITYA (SDC) ZARAH": "SDC",
-        "PRATIWI (KK) AZZAHRA NADIA": "KK",
-        "(DG) LAVINDI CLARISA TANTIOLA": "DG",
-        "BAYU SYAHPUTRO (SDC) MUHAMMAD": "SDC",
-        "(DG) HUTASOIT ESTHER SETIAWATI": "DG",
-        "RAHMA (KK) JIHAN BALQIS FITRIA": "KK",
-        "ROMAINUR (KK) SILVIA OLYVERA": "KK",
-        "WINARDO (KK) ABRI": "KK",
-        "ADIESTI (PP) DENNISSA AULIA": "PP",
-        "FRANSISCA LUBIS (KK) DIANA SUSAN": "KK",
-        "ESTUNINGTYAS (PP) MENIK": "PP",
-        "MICHELLE (GC) FEMME": "GC",
-        "THEODORUS (PP) KEVIN JOSHUA": "PP",
-        ". (GC) YUNINGSIH": "GC",
-        "ZAELANI (PP) MUHAMMAD SOLEH": "PP",
-        "WIBOWO (GC) ROBI": "GC",
-        "FITRIA RAHMA JIHAN BALQIS": "KK",
-        "SHIDIQ NUGRAHA MUHAMAD IQBAL": "GC",
-        "TAMBUN YOHANIS": "SDC",
-        "FAJRIA SAHISTA ACHADIARROHMA": "PKW",
-        "PERMANA SAKA": "GC",
-        "OKTARIA BR GINTING GRACETY FANI": "PP",
-        "AULIA LUBIS DEA DEFANNI": "PP",
-        "HAMIDIYATI NAZIFA": "GC",
-        "CHRISTIAN CLIVEN": "PP",
-        "NATHANIEL MICHAEL": "PP",
-        "PRATIWI PUSPA": "PKW",
-        "AZIZ MALDI ABDUL": "GC",
-        "JAGANEGARA HAIDAR": "GC",
-        "AKHMAL AMMAARZA": "KK",
-        "CHANDRA CHANDRA": "PP",
-        "MASITA MAYANG DEA": "PKW",
-        "KHAERUNNISA QURRATU AIN": "CBB",
-        "SEKAR AYU ADINDA ATHARIKA": "KK",
-        "PRIHASTIWI NURALISTA": "CBB",
-        "MONETRI FEBI CATUR": "GC",
-        "APSARI KEISA CHAIRANI": "PKW",
-        "SALSHABILA SUDRAJAT ALTIARA ASRA": "DG",
-        "AULIA HASNA": "DG",
-        "YOLANDHA NADYA": "LW",
-        "SANUSI SOFIA NUR INDAH EKATAMI": "KK",
-        "ANGGA ERON": "KK",
-        "RAVEN RIZQULLAH MUHAMMAD": "CBB",
-        "ROSADI IMRON": "KK",
-        "SUNARTO (BSD) EUPHEMIA ERNEST": "BSD",
-        "SUBANDI (PKW) WILLIAM HERDIYANTO": "PKW",
-        "(DG) HUTASOIT ESTHER SETIAWATI": "DG",
-        "NUGROHO (LW) YOHANES ADHI": "LW",
-        "VISCA (GC) NATHASYA MONICA": "GC",
-        "LESMANA PUTRI (GC) CHANELEEN MARVEL": "GC",
-        "(DG) PURBA RAPHAEL ZEFANYA": "DG",
-        "PATRIASARI (SDC) RUTH EMY": "SDC",
-        "KHOIRURRIZKY (PKW)FIRDA": "PKW",
-        "JABRY (GC) FAIS AL": "GC",
-        "AMANI (LW) SUHA": "LW",
-        "IBRAHIM (PP) FAISAL MAULANA": "PP",
-        "RAMADHAN (CBB) ALDI": "CBB",
-        "(DG) SALSHABILA SUDRAJAT ALTIARA ASRA": "DG",
-        "IDAYATI (PKW) DILLA": "PKW",
-        "AREZANTI (PP) SOPHIA DEWI": "PP",
-        "HIDAYAT (LW) DIMAS DARMAWAN SUSILO": "LW",
-        "THEODORUS (PP) KEVIN JOSHUA": "PP",
-        "PRATIWI (BSD) SITI CHOIRIYAH": "BSD",
-        "VIRGIANO (PKW) MAXELL": "PKW",
-        "BAYU SYAHPUTRO (SDC) MUHAMMAD": "SDC",
-        "WINARDO (KK) ABRI": "KK",
-        "ROMAINUR (KK) SILVIA OLYVERA": "KK",
-        "(DG) ABIMANYU ABDUL KARIM": "DG",
-        "NUGROHO RAHARDIAN WAHYU": "SDC",
-        "CHUMAIROH RAHMA": "GC",
-        "WIJAYA MEVIS VALERIA": "PP",
-        "SIREGAR TIURMAIDA": "KK",
-        "ANGGRAINI DIAH AYU": "KK",
-        "DANEA SINDI DINI": "KK",
-        "SIMANJUNTAK YANUAR JOSUA ALBERT MILANO": "PKW",
-        "NURYADI DEDE ALI": "KK",
-        "SHIDIQ NUGRAHA MUHAMAD IQBAL": "GC",
-        "LELITYA ZARAH": "KK",
-        "ZAELANI MUHAMMAD SOLEH": "PP",
-        "CHANDRA CHANDRA": "PP",
-        "PRATIWI PUSPA": "PKW",
-        "PUTRI AISYAH JAZULI": "PKW",
-        "ESTUNINGTYAS MENIK": "PP",
-        "SUNARTO EUPHEMIA ERNEST": "GC",
-        "LEE GABRILLE": "SDC",
-        "RAMADHAN ALDI": "CBB",
-        "EMY PATRIASARI RUTH": "SDC",
-        "YUNINGSIH YUNI": "GC",
-        "SIAHAAN RUTH ANGGRAINI": "SDC",
-        "ADLINNAKA ALNOCHAJASHANY": "CBB",
-        "MICHELLE FEMME": "GC",
-        "HIDAYAT DIMAS": "LW",
-        "NUGROHO YOHANES": "LW",
-        "JABRY FAIS AL": "GC",
-        "ZEFANYA PURBA RAPHAEL": "DG",
-        "SUBANDI WILLIAM HERDIYANTO": "PKW",
-        "VISCA NATHASYA": "GC",
-        "SYAHPUTRA MUHAMMAD ICHSAN": "GC",
-        "KARIM ABDUL": "DG",
-        "WSE CAD": "HO",
-        "SAABIHAAT DLIYAA US": "KK",
-        "PRATIWI AZZAHRA NADIA": "CBB",
-        "AREZANTI SOPHIA": "PP",
-        "ISMAIL LAKSMI RAMADHITA": "PP",
-        "RAMADHAN AUDIA": "DG",
-        "PRAMUDYA MUHAMMAD FAREL": "TBS",
-        "SATI RIFALDI YUSUF": "TBS",
-        # added 6 may 2024
-        "ABDULBAR SOEDIBYO FADHIEL": "GC",
-        "ROMAINUR SILVIA OLYVERA": "SMB",
-        "SEBRINA DELVIRA SALSHA": "BSD",
-        "HIDAYATULLAH RAJA GLEN": "PP",
-        "MIALIDINA NADIA": "SDC",
-        # added 10 may 2024
-        "UTAMI INDRIANI PUTRI": "KK",
-        "PUTRI (PKW) AISYAH JAZULI": "PKW",
-        "ALIFADIO NABIL": "SDC",
-        "SANUSI (KK) SOFIA NUR INDAH EKATAMI": "KK",
-        # added 3 jun 2024
-        "OCTAVIANO EZRA": "KK",
-    }
-    return consultant.map(map_consultant, na_action=None)
+
+def get_unmapped_consultants(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """Return the consultants without center, with their number of members.
+    members_without_center are the members who needed the consultant to get a center,
+    add these consultants to consultant_centers.csv first.
+
+    :param pd.DataFrame df_clean: cleaned member data.
+    :return pd.DataFrame: consultant, members, members_without_center.
+    """
+    consultants = df_clean["consultant"].astype(object)
+    codes, uniques = pd.factorize(consultants)
+    unmapped = resolve_consultant_centers(pd.Series(uniques, dtype=object)).isna().to_numpy()
+    is_unmapped = (codes >= 0) & unmapped[codes]
+    return (
+        df_clean.loc[is_unmapped]
+        .assign(without_center=lambda df_: df_["student_center"] == "NONE")
+        .groupby("consultant", observed=True)
+        .agg(members=("student_code", "size"), members_without_center=("without_center", "sum"))
+        .sort_values(["members_without_center", "members"], ascending=False)
+        .reset_index()
+    )
 
 
-def get_student_center(df_: pd.DataFrame) -> pd.Series:
+@lru_cache(maxsize=None)
+def get_center_classifier() -> Tuple[re.Pattern, dict]:
+    """Build the center pattern and the center to area lookup from config once.
+    If a center is listed in more than one area, the first area wins.
+
+    :return Tuple[re.Pattern, dict]: pattern capturing the center in a name, area of each center.
+    """
+    pattern = re.compile(f'({"|".join(config.centers)})')
+    area_of_center = {}
+    for area, centers in config.map_areas.items():
+        for center in centers:
+            area_of_center.setdefault(center, area)
+    return pattern, area_of_center
+
+
+def get_student_center(df_: pd.DataFrame, memo: dict = None) -> pd.Series:
     """
     Determine the center of the student
     based on the marker inside the name (for example DLC GC).
@@ -275,30 +469,32 @@ def get_student_center(df_: pd.DataFrame) -> pd.Series:
     to get center from consultant.
 
     :param pd.DataFrame df_: Dataframe.
+    :param dict memo: memo of get_member_center_from_consultant, see apply_unique.
     :return pd.Series: Center of each student. If no match the np.nan.
     """
-
-    pattern = f'({"|".join(config.centers)})'
+    pattern, _ = get_center_classifier()
+    membership = df_["student_membership"].str.lower()
+    center_in_name = df_["student_name"].str.upper().str.extract(pattern, expand=False)
 
     conditions = [
         # corporate
         (df_["is_cpt"] == True),
         # online center
-        (df_["student_membership"].str.lower() == "go"),
+        (membership == "go"),
         # ST
-        (df_["student_membership"].str.lower() == "street talk"),
+        (membership == "street talk"),
         # member code does not contain center identifier
-        ~(df_["student_name"].str.upper().str.contains(pattern, regex=True, na=False)),
+        center_in_name.isna(),
         # deluxe and vip, assuming they have center identifier
-        (df_["student_membership"].str.lower().isin(["deluxe", "vip"])),
+        (membership.isin(["deluxe", "vip"])),
     ]
 
     choices = [
         "Corporate",
         "Online Center",
         "Street Talk",
-        (get_member_center_from_consultant(df_["consultant"].str.upper())),
-        (df_["student_name"].str.upper().str.extract(pattern, expand=False)),
+        (get_member_center_from_consultant(df_["consultant"].str.upper(), memo)),
+        center_in_name,
     ]
 
     student_center = np.select(conditions, choices, default="NONE")
@@ -311,46 +507,60 @@ def get_area(df_):
     :param pd.DataFrame df_: Dataframe.
     :return pd.Series: Area of each student.
     """
-    conditions = [
-        df_["student_center"].isna(),
-        df_["student_center"].isin(config.map_areas.get("JKT 1")),
-        df_["student_center"].isin(config.map_areas.get("JKT 2")),
-        df_["student_center"].isin(config.map_areas.get("JKT 3")),
-        df_["student_center"].isin(config.map_areas.get("BDG")),
-        df_["student_center"].isin(config.map_areas.get("SBY")),
-        df_["student_center"].isin(config.map_areas.get("Other")),
-        df_["student_center"].isin(config.map_areas.get("Corporate")),
-        df_["student_center"].isin(config.map_areas.get("Online Center")),
-    ]
-    choices = [
-        "NONE",
-        "JKT 1",
-        "JKT 2",
-        "JKT 3",
-        "BDG",
-        "SBY",
-        "Other",
-        "Corporate",
-        "Online Center",
-    ]
-    area = np.select(conditions, choices, default="NONE")
+    _, area_of_center = get_center_classifier()
+    area = df_["student_center"].map(area_of_center).fillna("NONE").to_numpy()
     return area
 
 
-def clean_phone_number(ser: pd.Series) -> pd.Series:
+def clean_phone_number(ser: pd.Series, memo: dict = None) -> pd.Series:
     """Clean the phone number.
 
     :param pd.Series ser: phone number.
+    :param dict memo: see apply_unique.
     :return pd.Series: cleaned phone number.
     """
-    return (
-        ser.astype(str)
-        .str.replace("-", "", regex=False)
-        .str.replace("+", "", regex=False)
-        .str.strip()
+    return apply_unique(
+        ser,
+        lambda numbers: (
+            numbers.astype(str)
+            .str.replace("-", "", regex=False)
+            .str.replace("+", "", regex=False)
+            .str.strip()
+        ),
+        memo,
     )
 
 
+def compact(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """Convert the low cardinality columns to categorical and downcast the levels.
+    The categories are fixed from config so that frames of different months can be concatted
+    without falling back to object.
+
+    :param pd.DataFrame df_clean: cleaned member data.
+    :return pd.DataFrame: compact copy of df_clean.
+    :raises ValueError: if a column has a value that is not in its categories.
+    """
+    categories = {
+        "student_membership": config.memberships,
+        "student_center": [center for centers in config.map_areas.values() for center in centers]
+        + ["NONE"],
+        "student_area": list(config.map_areas) + ["NONE"],
+        "service_type": config.service_types,
+        "contract_status": config.contract_statuses,
+    }
+    df_compact = df_clean.copy()
+    for col, col_categories in categories.items():
+        unknown = set(df_clean[col].dropna().unique()) - set(col_categories)
+        if unknown:
+            raise ValueError(f"{col} has values {unknown} which are not in config.")
+        df_compact[col] = pd.Categorical(df_clean[col], categories=col_categories)
+    # consultants change too often to be listed in config
+    df_compact["consultant"] = df_clean["consultant"].astype("category")
+    for col in ["start_level", "current_level"]:
+        df_compact[col] = pd.to_numeric(df_clean[col], downcast="float")
+    return df_compact
+
+
 def get_code_with_multiple_name(
     df_clean: pd.DataFrame, code_col: str, name_col: str
 ) -> Tuple[int, str]:
@@ -373,3 +583,40 @@ def get_code_with_multiple_name(
         idx_code.append((row.Index, row.student_code))
 
     return idx_code
+
+
+def resolve_multiple_names(
+    df_clean: pd.DataFrame, code_col: str, name_col: str
+) -> pd.DataFrame:
+    """Drop the extra rows of codes with multiple name.
+    Most probably this is due to 1 account being freezed, or cad sales, or contract being invalid.
+    If the code has only one unique email (meaning that this is one person),
+    drop the names with "freeze" and "cad_sales".
+    If there are multiple emails (meaning that this is multiple people),
+    drop the one with invalid contract.
+    All masks are computed once and the rows are dropped in one pass.
+
+    :param pd.DataFrame df_clean
+    :param str code_col
+    :param str name_col
+    :return pd.DataFrame: df_clean without the dropped rows,
+        attrs["multiple_name_codes"] holds the codes which had multiple names.
+    """
+    codes = [code for _, code in get_code_with_multiple_name(df_clean, code_col, name_col)]
+    code_match = df_clean[code_col].isin(codes)
+
+    name_lower = df_clean[name_col].str.lower()
+    name_contains_freeze = name_lower.str.contains("freeze", na=False)
+    name_contains_cad = name_lower.str.contains("cad_sales|cad sales", na=False)
+    contract_invalid = df_clean["contract_status"] == "Invalid"
+    one_email = df_clean.groupby(code_col)["email"].transform("nunique") == 1
+
+    to_drop = code_match & (
+        (one_email & (name_contains_freeze | name_contains_cad))
+        | (~one_email & contract_invalid)
+    )
+    df_resolved = df_clean.loc[~to_drop]
+    # note: only these codes can still have multiple names, tests.validate checks them only
+    df_resolved.attrs["multiple_name_codes"] = codes
+    return df_resolved
+
@@ -0,0 +1,412 @@
+"""The member cleaning pipeline of a month: load, clean, resolve names, test and save.
+Importable, so that a notebook or a long running worker reuses the loaded config, the compiled
+patterns and the string transforms across months, see run. main.py is its command line.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+import pandas as pd
+import config
+import delta
+import instrument
+import manifest
+import module
+import store
+import tests
+import writers
+
+# settings of config.py which can be given per run, see run
+run_settings = [
+    "n_workers", "cache_dir", "cache_max_bytes", "backend", "chunksize", "drop_duplicate_rows",
+    "output_formats", "validation_sample", "store_path", "write_delta", "compact",
+    "trace_memory", "profile_stage",
+]
+# results of the string transforms, reused by every run in this process
+memo = {}
+
+
+def get_extract_paths(month: str, input_dir="input") -> list:
+    """Return the paths of the extracts of a month.
+    Sorted so that the concat order (and drop_duplicates keep="first") does not depend on OS.
+
+    :param str month: month folder under input_dir, like 2024-05.
+    :param input_dir: folder of the month folders.
+    :return list: paths of the extracts.
+    """
+    return sorted(Path(input_dir, month).glob("*.xls"))
+
+
+def load(month: str, n_workers: int = None, input_dir="input") -> pd.DataFrame:
+    """Load all extracts of a month as one DF.
+
+    :param str month: month folder under input_dir, like 2024-05.
+    :param int n_workers: processes used to read the extracts, default to config.n_workers.
+    :param input_dir: folder of the month folders.
+    :return pd.DataFrame: raw extracts.
+    """
+    df_ori = module.load_multiple_dfs(
+        get_extract_paths(month, input_dir),
+        n_workers=n_workers or config.n_workers,
+        cache_dir=config.cache_dir,
+        cache_max_bytes=config.cache_max_bytes,
+        drop_duplicates=config.drop_duplicate_rows,
+    )
+    for filename, count in df_ori.attrs.get("duplicates_removed", {}).items():
+        print(f"{filename}: {count} duplicate rows removed.")
+    return df_ori
+
+
+def clean_rows(df_ori: pd.DataFrame, memo: dict = None) -> pd.DataFrame:
+    """Clean each row of the raw extracts, the steps which do not look at other rows.
+
+    :param pd.DataFrame df_ori: raw extracts, or a chunk of them.
+    :param dict memo: results of the string transforms, see clean.
+    :return pd.DataFrame: cleaned rows, still with the duplicated members.
+    """
+    memo = {} if memo is None else memo
+    df_clean = (df_ori
+        .dropna(how="all", axis="rows")
+        .rename(columns=lambda c: c.lower().replace(" ", "_"))  # replace space with _
+        .assign(
+            student_name=lambda df_: module.create_student_name(
+                df_, memo.setdefault("student_name", {})
+            ),
+            student_membership=lambda df_: module.create_student_membership(
+                df_, memo.setdefault("student_membership", {})
+            ),
+            student_code=lambda df_: module.create_student_code(df_),
+            email=lambda df_: df_["email"].str.lower().str.strip(),
+            mobile=lambda df_: module.clean_phone_number(
+                df_["mobile"], memo.setdefault("mobile", {})
+            ),
+            consultant = lambda df_: df_["consultant"].str.upper(),
+            is_cpt = lambda df_: module.is_cpt(df_, memo.setdefault("is_cpt", {})),
+            student_center = lambda df_: module.get_student_center(
+                df_, memo.setdefault("consultant_center", {})
+            ),
+            student_area = lambda df_: module.get_area(df_),
+        )
+        .assign(
+            student_center = lambda df_: df_["student_center"].fillna("NONE"),
+            student_area = lambda df_: df_["student_area"].fillna("NONE"),
+        )
+        # ! drop ST
+        .loc[
+            lambda df_: ~(
+                df_["student_code"].str.contains("STREET TALK|STREETTALK", na=False)
+            )
+        ]
+        # ! drop unnecessary cols
+        # note: the other unused cols are not read, see config.extract_dtypes
+        .drop(columns=["first_name", "last_name"])
+    )
+    return df_clean
+
+
+def clean(df_ori: pd.DataFrame, memo: dict = None, backend: str = None) -> pd.DataFrame:
+    """Clean the raw extracts into one row per member.
+
+    :param pd.DataFrame df_ori: raw extracts from load.
+    :param dict memo: results of the string transforms, pass the same dict to reuse them
+        across months, see module.apply_unique. Not used by the polars backend.
+    :param str backend: pandas or polars (see polars_backend.py), default to config.backend.
+    :return pd.DataFrame: cleaned member data.
+    """
+    if (backend or config.backend) == "polars":
+        import polars_backend  # note: polars is only needed for this backend
+
+        return polars_backend.clean(df_ori)
+
+    df_clean = (clean_rows(df_ori.dropna(how="all", axis="columns"), memo)
+        # ! drop duplicated member based on student code, end date and student name
+        # somehow there is a student with different start date but same end date
+        .drop_duplicates(subset=["student_code", "end_date"], keep="first")
+        .drop_duplicates(subset=["student_code", "student_name"], keep="first")
+    )
+    return df_clean
+
+
+def load_clean_chunks(
+    month: str, chunksize: int, memo: dict = None, record: dict = None, input_dir="input"
+) -> pd.DataFrame:
+    """Load and clean the extracts of a month chunk by chunk, with the same result as
+    clean(load(month)). Each chunk is cleaned right after it is parsed and only its new members
+    are kept, the duplicates of the previous chunks are found by the hash of their keys.
+    Peak memory is one chunk plus the cleaned members instead of all the extracts.
+    The parsed extract cache is not used.
+
+    :param str month: month folder under input_dir, like 2024-05.
+    :param int chunksize: rows parsed and cleaned at once.
+    :param dict memo: results of the string transforms, see clean.
+    :param dict record: stage record, filled with rows_in and unique_rows.
+    :param input_dir: folder of the month folders.
+    :return pd.DataFrame: cleaned member data, not resolved yet.
+    """
+    seen_rows, seen_code_end_date, seen_code_name = set(), set(), set()
+    has_values = {}
+    duplicates_removed = {}
+    n_rows = 0
+    chunks = []
+    for filepath in get_extract_paths(month, input_dir):
+        duplicates_removed[filepath.name] = 0
+        offset = n_rows
+        for chunk in module.iter_extract_chunks(filepath, chunksize):
+            # same index as pd.concat of the whole extracts
+            chunk.index += offset
+            n_rows += len(chunk)
+            if config.drop_duplicate_rows:
+                is_first = module.is_first_seen(chunk, seen_rows)
+                duplicates_removed[filepath.name] += int((~is_first).sum())
+                chunk = chunk.loc[is_first]
+            for col, col_has_values in chunk.notna().any().items():
+                has_values[col] = has_values.get(col, False) or col_has_values
+            if chunk.empty:  # note: the transforms give object dtype on no rows
+                continue
+
+            chunk = clean_rows(chunk, memo)
+            chunk = chunk.loc[
+                module.is_first_seen(chunk, seen_code_end_date, ["student_code", "end_date"])
+            ]
+            chunks.append(chunk.loc[
+                module.is_first_seen(chunk, seen_code_name, ["student_code", "student_name"])
+            ])
+        print(f"{filepath.name}: {duplicates_removed[filepath.name]} duplicate rows removed.")
+
+    # columns without any value are dropped, like dropna(how="all", axis="columns") in clean
+    empty_cols = [
+        col.lower().replace(" ", "_") for col, col_has_values in has_values.items()
+        if not col_has_values
+    ]
+    df_clean = pd.concat(chunks).drop(columns=empty_cols, errors="ignore")
+    if record is not None:
+        record["rows_in"] = n_rows
+        record["unique_rows"] = n_rows - sum(duplicates_removed.values())
+    df_clean.attrs["duplicates_removed"] = duplicates_removed
+    return df_clean
+
+
+def resolve_names(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """For code with multiple name, drop the freezed / cad sales / invalid contract rows."""
+    return module.resolve_multiple_names(df_clean, "student_code", "student_name")
+
+
+def test(df_clean: pd.DataFrame, sample: int = None, report: dict = None) -> dict:
+    """Validate the cleaned member data and raise with every failed rule.
+
+    :param pd.DataFrame df_clean: cleaned member data.
+    :param int sample: validate about this many rows only, default to config.validation_sample.
+    :param dict report: run report, the result of each rule is added to report["validation"].
+    :return dict: validation report, see tests.validate.
+    :raises AssertionError: if any rule failed.
+    """
+    validation = tests.validate(
+        df_clean,
+        candidate_codes=df_clean.attrs.get("multiple_name_codes"),
+        sample=sample or config.validation_sample,
+    )
+    if report is not None:
+        # note: the first 100 offending rows only, to keep the report small
+        report["validation"] = {
+            rule: {**result, "count": len(result["rows"]), "rows": result["rows"][:100]}
+            for rule, result in validation.items()
+        }
+    failed = [
+        f"{rule}: {result['detail']}" for rule, result in validation.items() if not result["passed"]
+    ]
+    assert not failed, "Validation failed.\n" + "\n".join(failed)
+    return validation
+
+
+def get_output_files(formats: list = None) -> list:
+    """Return the output file names of the formats.
+
+    :param list formats: output formats, default to config.output_formats.
+    :return list: file names like coco_member.xlsx.
+    """
+    return [f"{config.output_name}.{fmt}" for fmt in formats or config.output_formats]
+
+
+def save(df_clean: pd.DataFrame, month: str, formats: list = None, output_dir="output") -> None:
+    """Save the cleaned member data to <output_dir>/<month>/coco_member.<format>.
+
+    :param pd.DataFrame df_clean: cleaned member data.
+    :param str month: month folder under output_dir.
+    :param list formats: output formats, default to config.output_formats, see writers.py.
+    :param output_dir: folder of the month outputs.
+    """
+    filepaths = writers.write(
+        df_clean, Path(output_dir, month), config.output_name, formats or config.output_formats
+    )
+    print(f"Saved {', '.join(filepath.name for filepath in filepaths)}.")
+
+
+def update_from_output(month: str, report: dict, formats: list = None, output_dir="output") -> None:
+    """Write the delta and save to the store a month which is up to date, from its saved output.
+    The delta also depends on the previous month, and write_delta and store_path are not
+    in the manifest, so they are done again whenever they are asked, see process_month.
+    The store upsert of a month replaces its rows, so doing it again is safe.
+
+    :param str month: month folder under output_dir, like 2024-05.
+    :param dict report: run report from instrument.new_report, the stages are added to it.
+    :param list formats: output formats, default to config.output_formats, see writers.py.
+    :param output_dir: folder of the month outputs.
+    """
+    if not (config.write_delta or config.store_path):
+        return
+    df_clean = writers.read(Path(output_dir, month), config.output_name)
+    if config.write_delta:
+        with instrument.stage(report, "delta", len(df_clean)) as record:
+            df_delta = delta.write_delta(df_clean, month, formats, output_dir)
+            record["rows_out"] = None if df_delta is None else len(df_delta)
+    if config.store_path:
+        with instrument.stage(report, "store", len(df_clean)) as record:
+            store.upsert(df_clean, month, config.store_path)
+            record["rows_out"] = len(df_clean)
+
+
+def process_month(
+    month: str,
+    n_workers: int = None,
+    force: bool = False,
+    formats: list = None,
+    memo: dict = None,
+    report: dict = None,
+    profile_stage: str = None,
+    input_dir="input",
+    output_dir="output",
+) -> pd.DataFrame:
+    """Load, clean, test and save the member data of one month.
+    Nothing is done if the output was built from the same extracts and rules, see manifest.py.
+    Time, rows and memory of each stage are saved to <output_dir>/<month>/run_report.json.
+
+    :param str month: month folder under input_dir, like 2024-05.
+    :param int n_workers: processes used to read the extracts, default to config.n_workers.
+    :param bool force: rebuild the output even if it is up to date.
+    :param list formats: output formats, default to config.output_formats, see writers.py.
+    :param dict memo: results of the string transforms, see clean.
+    :param dict report: filled with the run report, see instrument.py.
+    :param str profile_stage: stage to run with cProfile, default to config.profile_stage.
+        The stats are saved to <output_dir>/<month>/profile_<stage>.prof.
+    :param input_dir: folder of the month folders of extracts.
+    :param output_dir: folder of the month outputs.
+    :return pd.DataFrame: cleaned member data, None if the output is up to date.
+    """
+    output_path = Path(output_dir, month)
+    report = {} if report is None else report
+    report.update(instrument.new_report(month))
+    month_manifest = manifest.build_manifest(get_extract_paths(month, input_dir))
+    if not force and manifest.is_up_to_date(
+        output_path, month_manifest, get_output_files(formats)
+    ):
+        report["skipped"] = True
+        print("Output is up to date.")
+        update_from_output(month, report, formats, output_dir)
+        return None
+
+    output_path.mkdir(parents=True, exist_ok=True)
+    profile_stage = profile_stage or config.profile_stage
+
+    def stage(name: str, rows_in: int = None):
+        profile_path = output_path / f"profile_{name}.prof" if name == profile_stage else None
+        return instrument.stage(report, name, rows_in, config.trace_memory, profile_path)
+
+    try:
+        if config.chunksize:
+            with stage("load_clean") as record:
+                df_clean = load_clean_chunks(month, config.chunksize, memo, record, input_dir)
+                record["rows_out"] = len(df_clean)
+        else:
+            with stage("load") as record:
+                df_ori = load(month, n_workers, input_dir)
+                record["rows_in"] = len(df_ori) + sum(
+                    df_ori.attrs.get("duplicates_removed", {}).values()
+                )
+                record["rows_out"] = len(df_ori)
+            with stage("clean", len(df_ori)) as record:
+                df_clean = clean(df_ori, memo)
+                record["rows_out"] = len(df_clean)
+        with stage("resolve_names", len(df_clean)) as record:
+            df_clean = resolve_names(df_clean)
+            record["rows_out"] = len(df_clean)
+        with stage("test", len(df_clean)) as record:
+            # note: written before the rules are checked, it explains the members without center
+            unmapped = module.get_unmapped_consultants(df_clean)
+            unmapped.to_csv(output_path / "unmapped_consultants.csv", index=False)
+            report["unmapped_consultants"] = len(unmapped)
+            test(df_clean, report=report)
+            record["rows_out"] = len(df_clean)
+        if config.compact:
+            with stage("compact", len(df_clean)) as record:
+                memory_before = df_clean.memory_usage(deep=True).sum()
+                df_clean = module.compact(df_clean)
+                memory_after = df_clean.memory_usage(deep=True).sum()
+                record["rows_out"] = len(df_clean)
+            print(f"Memory: {memory_before / 1024 ** 2:.1f} MB -> {memory_after / 1024 ** 2:.1f} MB.")
+        with stage("save", len(df_clean)) as record:
+            save(df_clean, month, formats, output_dir)
+            record["rows_out"] = len(df_clean)
+        if config.write_delta:
+            with stage("delta", len(df_clean)) as record:
+                df_delta = delta.write_delta(df_clean, month, formats, output_dir)
+                record["rows_out"] = None if df_delta is None else len(df_delta)
+        if config.store_path:
+            with stage("store", len(df_clean)) as record:
+                store.upsert(df_clean, month, config.store_path)
+                record["rows_out"] = len(df_clean)
+    finally:
+        # note: saved on failure too, with the stages done and the failed validation rules
+        instrument.save_report(report, output_path)
+
+    manifest.write_manifest(output_path, month_manifest)
+    return df_clean
+
+
+@contextmanager
+def use_settings(options: dict):
+    """Use the options instead of the settings of config.py until the end of the with block.
+
+    :param dict options: setting name: value, any of run_settings.
+    :raises ValueError: if an option is not in run_settings.
+    """
+    unknown = sorted(set(options) - set(run_settings))
+    if unknown:
+        raise ValueError(f"Unknown options {unknown}, use any of {run_settings}.")
+    previous = {name: getattr(config, name) for name in options}
+    for name, value in options.items():
+        setattr(config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(config, name, value)
+
+
+def run(
+    month: str,
+    input_dir="input",
+    output_dir="output",
+    options: dict = None,
+    force: bool = False,
+    report: dict = None,
+) -> pd.DataFrame:
+    """Run the pipeline of a month, see process_month.
+    If the output is up to date, the month is not run again and its saved output is returned.
+    Call it again in the same process for other months: config.py, the compiled center patterns
+    and consultant index and the results of the string transforms are reused.
+
+    :param str month: month folder under input_dir, like 2024-05.
+    :param input_dir: folder of the month folders of extracts.
+    :param output_dir: folder of the month outputs.
+    :param dict options: settings of config.py for this run only, any of run_settings,
+        like {"backend": "polars", "output_formats": ["xlsx", "parquet"]}.
+    :param bool force: rebuild the output even if it is up to date.
+    :param dict report: filled with the run report, see instrument.py.
+    :return pd.DataFrame: cleaned member data.
+    """
+    with use_settings(options or {}):
+        df_clean = process_month(
+            month, force=force, memo=memo, report=report,
+            input_dir=input_dir, output_dir=output_dir,
+        )
+    if df_clean is None:
+        df_clean = writers.read(Path(output_dir, month), config.output_name)
+    return df_clean
@@ -0,0 +1,158 @@
+"""The cleaning of pipeline.clean as a polars lazy query, see config.backend.
+Same rules and same output as the pandas chain, but the query is optimized as a whole:
+the Street Talk filter and the member dedup run before the email, phone, CPT and center columns
+are computed, no copy is made per column and the columns are computed on all cores.
+Needs polars and pyarrow (to convert from and to pandas).
+"""
+import importlib.util
+import numpy as np
+import pandas as pd
+import polars as pl
+import config
+import module
+
+# note: rows keep their pandas index in this column, to give back the same index
+index_col = "__index__"
+
+
+def student_name() -> pl.Expr:
+    """Last name then first name, title case, see module.create_student_name."""
+    return pl.concat_str(["last_name", "first_name"], separator=" ").str.to_titlecase()
+
+
+def student_membership() -> pl.Expr:
+    """Membership from service type and the marker in the name, see module.create_student_membership."""
+    name_upper = pl.col("student_name").str.to_uppercase()
+    name_contains_dlx = name_upper.str.contains("(DLX", literal=True).fill_null(False)
+    name_contains_go = name_upper.str.contains("(GO", literal=True).fill_null(False)
+    name_contains_st = name_upper.str.contains("STREET TALK|STREETTALK").fill_null(False)
+    return (
+        pl.when(name_contains_st).then(pl.lit("Street Talk"))
+        .when(name_contains_go).then(pl.lit("Go"))
+        .when(~name_contains_go & (pl.col("service_type") == "Standard")).then(pl.lit("Deluxe"))
+        .when(~name_contains_go & name_contains_dlx).then(pl.lit("Deluxe"))
+        .when(pl.col("service_type") == "VIP").then(pl.lit("VIP"))
+        .otherwise(pl.lit("NONE"))
+    )
+
+
+def is_cpt() -> pl.Expr:
+    """CPT consultant or CPT marker in the name, see module.is_cpt."""
+    consultant_cpt = pl.col("consultant").str.to_uppercase().is_in(config.cpt_consultants)
+    id_contains_cpt = pl.col("student_name").str.to_uppercase().str.contains(r"\WCPT\W")
+    return consultant_cpt.fill_null(False) | id_contains_cpt.fill_null(False)
+
+
+def get_consultant_centers(consultants: pd.Series) -> dict:
+    """Center of each uppercase consultant, resolved once per consultant by
+    module.resolve_consultant_centers so that both backends give the same center.
+    """
+    consultants = pd.Series(consultants.dropna().str.upper().unique(), dtype=object)
+    centers = module.resolve_consultant_centers(consultants)
+    return dict(zip(consultants[centers.notna()], centers[centers.notna()]))
+
+
+def student_center(consultant_centers: dict) -> pl.Expr:
+    """Center from the marker in the name, or from the consultant, see module.get_student_center.
+
+    :param dict consultant_centers: from get_consultant_centers.
+    """
+    pattern, _ = module.get_center_classifier()
+    membership = pl.col("student_membership").str.to_lowercase()
+    center_in_name = pl.col("student_name").str.to_uppercase().str.extract(pattern.pattern, 1)
+    center_of_consultant = pl.col("consultant").replace_strict(
+        consultant_centers, default=None, return_dtype=pl.String
+    )
+    return (
+        pl.when(pl.col("is_cpt")).then(pl.lit("Corporate"))
+        .when(membership == "go").then(pl.lit("Online Center"))
+        .when(membership == "street talk").then(pl.lit("Street Talk"))
+        .when(center_in_name.is_null()).then(center_of_consultant)
+        .when(membership.is_in(["deluxe", "vip"])).then(center_in_name)
+        .otherwise(pl.lit("NONE"))
+        .fill_null("NONE")
+    )
+
+
+def student_area() -> pl.Expr:
+    """Area of the center, see module.get_area."""
+    _, area_of_center = module.get_center_classifier()
+    return pl.col("student_center").replace_strict(
+        area_of_center, default="NONE", return_dtype=pl.String
+    )
+
+
+def clean_phone_number() -> pl.Expr:
+    """Phone number without - and +, see module.clean_phone_number."""
+    # note: astype(str) in pandas turns missing numbers into "nan"
+    return (
+        pl.col("mobile").fill_null("nan")
+        .str.replace_all("-", "", literal=True)
+        .str.replace_all("+", "", literal=True)
+        .str.strip_chars()
+    )
+
+
+def clean(df_ori: pd.DataFrame) -> pd.DataFrame:
+    """Clean the raw extracts into one row per member, same output as pipeline.clean.
+
+    :param pd.DataFrame df_ori: raw extracts from pipeline.load.
+    :return pd.DataFrame: cleaned member data.
+    :raises AssertionError: if some memberships are not specified, like module.create_student_membership.
+    :raises ImportError: if pyarrow is not installed.
+    """
+    if importlib.util.find_spec("pyarrow") is None:
+        raise ImportError(
+            'The polars backend needs pyarrow, pip install pyarrow or use backend = "pandas".'
+        )
+    df_ori = (
+        df_ori.dropna(how="all", axis="columns")
+        .rename(columns=lambda c: c.lower().replace(" ", "_"))
+    )
+    columns = [col for col in df_ori.columns if col not in ["first_name", "last_name"]] + [
+        "student_name", "student_membership", "is_cpt", "student_center", "student_area",
+    ]
+    raw_columns = list(df_ori.columns)
+    consultant_centers = get_consultant_centers(df_ori["consultant"])
+
+    members = (
+        pl.from_pandas(df_ori.assign(**{index_col: df_ori.index}))
+        .lazy()
+        .filter(~pl.all_horizontal(pl.col(raw_columns).is_null()))
+        .with_columns(student_name=student_name())
+        .with_columns(student_membership=student_membership())
+    )
+    query = (
+        members
+        .with_columns(
+            student_code=pl.col("student_membership") + " "
+            + pl.col("student_code").cast(pl.Int64).cast(pl.String)
+        )
+        # ! drop ST
+        .filter(~pl.col("student_code").str.contains("STREET TALK|STREETTALK").fill_null(False))
+        # ! drop duplicated member based on student code, end date and student name
+        .unique(subset=["student_code", "end_date"], keep="first", maintain_order=True)
+        .unique(subset=["student_code", "student_name"], keep="first", maintain_order=True)
+        # the other columns are only computed for the remaining members
+        .with_columns(
+            email=pl.col("email").str.to_lowercase().str.strip_chars(),
+            mobile=clean_phone_number(),
+            consultant=pl.col("consultant").str.to_uppercase(),
+        )
+        .with_columns(is_cpt=is_cpt())
+        .with_columns(student_center=student_center(consultant_centers))
+        .with_columns(student_area=student_area())
+        .select(columns + [index_col])
+    )
+    # note: the membership check runs on all rows, before the filter and dedup
+    df_clean, unspecified = pl.collect_all(
+        [query, members.select((pl.col("student_membership") == "NONE").sum())]
+    )
+    assert not unspecified.item(), "Some memberships are not specified."
+
+    df_clean = df_clean.to_pandas().set_index(index_col).rename_axis(df_ori.index.name)
+    # polars gives None for missing strings, pandas NaN
+    obj_cols = df_clean.select_dtypes("object").columns
+    df_clean[obj_cols] = df_clean[obj_cols].where(df_clean[obj_cols].notna(), np.nan)
+    df_clean.attrs = df_ori.attrs
+    return df_clean
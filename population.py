@@ -0,0 +1,128 @@
+"""Active member population per center (or area) over time, for the Member Population per Center Report.
+
+python population.py --freq D
+python population.py --start 2023-11 --end 2024-05 --by student_area --freq M
+"""
+import argparse
+from pathlib import Path
+from typing import List
+import numpy as np
+import pandas as pd
+import config
+import writers
+
+# pandas resample rule of each output frequency
+freqs = {"D": "D", "W": "W", "M": "ME"}
+
+
+def get_contracts(df_months: pd.DataFrame) -> pd.DataFrame:
+    """Keep each contract once, with the data of the latest month.
+    A contract is a code and start date like in cohort.get_intervals, so a contract extended
+    between months (same start, later end date) is counted once, with its latest end date.
+
+    :param pd.DataFrame df_months: cleaned member data of many months, oldest month first.
+    :return pd.DataFrame: cleaned member data, one row per contract.
+    """
+    return df_months.drop_duplicates(subset=["student_code", "start_date"], keep="last")
+
+
+def load_months(months: List[str]) -> pd.DataFrame:
+    """Load the cleaned member data of many months as one DF.
+    A member is in the output of every month its contract was active, see get_contracts.
+
+    :param List[str] months: month folders under output/.
+    :return pd.DataFrame: cleaned member data, one row per contract.
+    """
+    df = pd.concat(
+        [writers.read(Path("output", month), config.output_name) for month in sorted(months)],
+        ignore_index=True,
+    )
+    return get_contracts(df)
+
+
+def get_population(
+    df_clean: pd.DataFrame,
+    freq: str = "D",
+    by: str = "student_center",
+    start=None,
+    end=None,
+) -> pd.DataFrame:
+    """Count the members active on each date per group in one pass.
+    A member is active from the day of start_date to the day of end_date (inclusive).
+    Each member is a +1 event on the start day and a -1 event on the day after the end,
+    the events are summed per group and day and the cumulative sum is the population,
+    so the cost does not depend on the number of dates asked.
+
+    :param pd.DataFrame df_clean: cleaned member data, one row per contract, see load_months.
+    :param str freq: D for daily, W for weekly or M for monthly. Weekly and monthly are
+        the population on the last day of the period.
+    :param str by: column to group by, like student_center or student_area.
+    :param start: first date, default to the earliest start date.
+    :param end: last date, default to the latest end date.
+    :return pd.DataFrame: population with one row per date and one column per group.
+    :raises ValueError: if freq is not in freqs.
+    """
+    if freq not in freqs:
+        raise ValueError(f"Unknown freq {freq}, choose from {list(freqs)}.")
+
+    df_ = df_clean.loc[df_clean["start_date"].notna(), [by, "start_date", "end_date"]]
+    start_day = df_["start_date"].dt.normalize()
+    # note: no end date means still active, its -1 event is never reached
+    after_end_day = df_["end_date"].dt.normalize() + pd.Timedelta(days=1)
+    start = pd.Timestamp(start) if start is not None else start_day.min()
+    if end is not None:
+        end = pd.Timestamp(end)
+    else:
+        end = (
+            after_end_day.max() - pd.Timedelta(days=1)
+            if after_end_day.notna().any()
+            else start_day.max()
+        )
+    dates = pd.date_range(start, end, freq="D")
+
+    # note: members active before start are counted on start, events after end are dropped
+    events = pd.DataFrame(
+        {
+            by: np.concatenate([df_[by].to_numpy(), df_[by].to_numpy()]),
+            "date": np.concatenate(
+                [start_day.clip(lower=start).to_numpy(), after_end_day.clip(lower=start).to_numpy()]
+            ),
+            "change": np.repeat([1, -1], len(df_)),
+        }
+    )
+    events = events.loc[events["date"].notna() & (events["date"] <= end)]
+    population = (
+        events.groupby(["date", by])["change"].sum()
+        .unstack(by, fill_value=0)
+        .reindex(dates, fill_value=0)
+        .cumsum()
+        .rename_axis(index="date", columns=by)
+    )
+    if freq != "D":
+        population = population.resample(freqs[freq]).last()
+    return population
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Active member population over time.")
+    parser.add_argument("--start", help="first month of output/ to load, like 2023-11")
+    parser.add_argument("--end", help="last month of output/ to load, like 2024-05")
+    parser.add_argument("--freq", default="D", choices=list(freqs))
+    parser.add_argument("--by", default="student_center", help="student_center or student_area")
+    parser.add_argument("--from-date", help="first date of the population, like 2023-01-01")
+    parser.add_argument("--to-date", help="last date of the population, like 2024-12-31")
+    parser.add_argument("--output", help="csv file, default to output/population_<by>_<freq>.csv")
+    args = parser.parse_args()
+
+    months = [
+        path.parent.name
+        for path in sorted(Path("output").glob(f"*/{config.output_name}.*"))
+        if (args.start is None or path.parent.name >= args.start)
+        and (args.end is None or path.parent.name <= args.end)
+    ]
+    population = get_population(
+        load_months(sorted(set(months))), args.freq, args.by, args.from_date, args.to_date
+    )
+    output_path = Path(args.output or Path("output", f"population_{args.by}_{args.freq}.csv"))
+    population.to_csv(output_path)
+    print(f"Population of {population.shape[1]} groups, {len(population)} dates saved to {output_path}.")
@@ -0,0 +1,181 @@
+"""Regression gate: re-run every month which has a golden output (golden/<month>/coco_member.xlsx)
+and fail if the result changed, or if a month got slower or used more memory than the recorded baseline.
+
+python regression.py
+python regression.py --months 2024-04 2024-05 --tolerance 0.5
+python regression.py --record          # save the time and memory of this run as the baseline
+python regression.py --update-golden   # accept the new outputs as golden, after review
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List
+import pandas as pd
+import config
+import delta
+import instrument
+import pipeline
+import writers
+
+baseline_path = Path("regression_baseline.json")
+# note: not output/, main.py and batch.py rewrite the outputs whenever the rules change
+golden_dir = Path("golden")
+
+
+def get_golden_months() -> List[str]:
+    """Return the months with extracts in input/ and a golden xlsx in golden/."""
+    return sorted(
+        path.parent.name
+        for path in golden_dir.glob(f"*/{config.output_name}.xlsx")
+        if Path("input", path.parent.name).is_dir()
+    )
+
+
+def is_same_rows(df_golden: pd.DataFrame, df_output: pd.DataFrame) -> bool:
+    """Check that both have the same rows, duplicates included, in any order."""
+    if set(df_golden.columns) != set(df_output.columns) or len(df_golden) != len(df_output):
+        return False
+    columns = list(df_golden.columns)
+    try:
+        pd.testing.assert_frame_equal(
+            df_golden.sort_values(columns).reset_index(drop=True),
+            df_output[columns].sort_values(columns).reset_index(drop=True),
+        )
+    except AssertionError:
+        return False
+    return True
+
+
+def check_month(month: str, update_golden: bool = False) -> dict:
+    """Run the pipeline of a month and compare its xlsx with the golden one, ignoring row order.
+    The rows are compared as a whole, so a duplicated row is a difference. The added, removed and
+    changed codes of delta.get_delta explain the difference.
+    The output is written to a temporary folder, so the golden output is left as is.
+    Run it in a new process to measure the peak memory of this month only, see run.
+
+    :param str month: month folder under input/.
+    :param bool update_golden: replace the golden xlsx with the new one.
+    :return dict: month, seconds, max_rss_mb, whether the rows are the same, the row counts,
+        the duplicated codes of the output, and the rows added, removed and changed
+        (with the changed columns) compared to the golden output.
+    """
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # note: the delta and the store would read or write the real outputs, and the parse cache
+        # would skip parse_extract and make the time depend on the runs before
+        options = {
+            "n_workers": 1, "output_formats": ["xlsx"], "write_delta": False, "store_path": None,
+            "cache_dir": None,
+        }
+        pipeline.run(month, "input", tmp_dir, options, force=True, report=report)
+
+        # note: both are read back from xlsx, so they have the same dtypes
+        golden_path = Path(golden_dir, month, f"{config.output_name}.xlsx")
+        output_path = Path(tmp_dir, month, f"{config.output_name}.xlsx")
+        df_golden = writers.read_xlsx(golden_path)
+        df_output = writers.read_xlsx(output_path)
+        same_rows = is_same_rows(df_golden, df_output)
+        df_delta = delta.get_delta(df_golden, df_output)
+        if update_golden:
+            shutil.copy(output_path, golden_path)
+
+    counts = df_delta["change"].value_counts()
+    return {
+        "month": month,
+        "seconds": sum(record["seconds"] for record in report["stages"]),
+        "max_rss_mb": instrument.get_max_rss_mb(),
+        "columns_differ": sorted(set(df_golden.columns) ^ set(df_output.columns)),
+        "same_rows": same_rows,
+        "golden_rows": len(df_golden),
+        "output_rows": len(df_output),
+        "duplicated_codes": int(df_output["student_code"].duplicated().sum()),
+        "added": int(counts.get("added", 0)),
+        "removed": int(counts.get("removed", 0)),
+        "changed": int(counts.get("changed", 0)),
+        "changed_columns": (
+            df_delta["changed_columns"].str.split(",").explode().value_counts().to_dict()
+        ),
+    }
+
+
+def check_budget(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return the budgets a month went over, its baseline value times 1 + tolerance."""
+    over = []
+    for metric in ["seconds", "max_rss_mb"]:
+        if result.get(metric) is None or baseline.get(metric) is None:
+            continue
+        budget = baseline[metric] * (1 + tolerance)
+        if result[metric] > budget:
+            over.append(f"{metric} {result[metric]:.1f} > {budget:.1f}")
+    return over
+
+
+def run(
+    months: List[str], tolerance: float, record: bool = False, update_golden: bool = False
+) -> bool:
+    """Check every month and print the result.
+
+    :param List[str] months: months to check.
+    :param float tolerance: allowed slow down and memory increase, 0.25 for 25%.
+    :param bool record: save the time and memory of this run as the baseline.
+    :param bool update_golden: replace the golden outputs with the new ones.
+    :return bool: True if every month gave the golden output within budget.
+    """
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+
+    # note: one process per month, the peak memory of a process never goes down
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        results = list(executor.map(check_month, months, [update_golden] * len(months)))
+
+    passed = True
+    print(f"\n{'month':<10}{'seconds':>9}{'max MB':>9}  result")
+    for result in results:
+        failures = []
+        if result["columns_differ"]:
+            failures.append(f"columns differ {result['columns_differ']}")
+        if not result["same_rows"]:
+            failures.append(
+                f"{result['output_rows']} rows ({result['golden_rows']} golden), "
+                f"{result['duplicated_codes']} duplicated codes, "
+                f"{result['added']} added, {result['removed']} removed, "
+                f"{result['changed']} changed {result['changed_columns']}"
+            )
+        if not record and result["month"] not in baseline:
+            # note: a month without baseline would never be checked for time and memory
+            failures.append(f"no baseline in {baseline_path}, run with --record")
+        elif not record:
+            failures += check_budget(result, baseline[result["month"]], tolerance)
+        passed = passed and not failures
+        print(
+            f"{result['month']:<10}{result['seconds']:>9.1f}{result['max_rss_mb'] or 0:>9.0f}  "
+            f"{'; '.join(failures) or 'ok'}"
+        )
+
+    if record:
+        baseline.update(
+            {
+                result["month"]: {"seconds": result["seconds"], "max_rss_mb": result["max_rss_mb"]}
+                for result in results
+            }
+        )
+        baseline_path.write_text(json.dumps(baseline, indent=4))
+        print(f"Baseline saved to {baseline_path}.")
+    if update_golden:
+        print("Golden outputs updated.")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare every month with its golden output.")
+    parser.add_argument("--months", nargs="+", help="default to every month with a golden output")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slow down, 0.25 for 25%%")
+    parser.add_argument("--record", action="store_true", help="save this run as the baseline")
+    parser.add_argument("--update-golden", action="store_true", help="accept the new outputs")
+    args = parser.parse_args()
+
+    passed = run(args.months or get_golden_months(), args.tolerance, args.record, args.update_golden)
+    sys.exit(0 if passed else 1)
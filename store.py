@@ -0,0 +1,171 @@
+"""SQLite store of the cleaned member data of all months, to answer questions across months
+without reading every output again.
+
+member_history has one row per student_code and month, members the latest row of each code
+with the first and last month it was seen.
+"""
+import sqlite3
+from contextlib import closing
+import pandas as pd
+
+# column: sqlite type, dates are stored as "YYYY-MM-DD HH:MM:SS" text so that they sort
+member_columns = {
+    "student_code": "TEXT NOT NULL",
+    "student_name": "TEXT",
+    "student_membership": "TEXT",
+    "date_of_birth": "TEXT",
+    "mobile": "TEXT",
+    "email": "TEXT",
+    "service_type": "TEXT",
+    "consultant": "TEXT",
+    "start_date": "TEXT",
+    "end_date": "TEXT",
+    "start_level": "REAL",
+    "current_level": "REAL",
+    "contract_status": "TEXT",
+    "is_cpt": "INTEGER",
+    "student_center": "TEXT",
+    "student_area": "TEXT",
+}
+date_columns = ["date_of_birth", "start_date", "end_date"]
+
+
+def connect(path) -> sqlite3.Connection:
+    """Open the store and create the tables and indexes if needed."""
+    # note: batch.py workers write their months at the same time, wait for the lock
+    conn = sqlite3.connect(path, timeout=60)
+    columns = ",\n    ".join(f"{col} {sql_type}" for col, sql_type in member_columns.items())
+    conn.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS member_history (
+            month TEXT NOT NULL,
+            {columns},
+            PRIMARY KEY (student_code, month)
+        );
+        CREATE TABLE IF NOT EXISTS members (
+            {columns},
+            first_month TEXT NOT NULL,
+            last_month TEXT NOT NULL,
+            PRIMARY KEY (student_code)
+        );
+        CREATE INDEX IF NOT EXISTS history_month ON member_history (month);
+        CREATE INDEX IF NOT EXISTS history_center ON member_history (student_center);
+        CREATE INDEX IF NOT EXISTS history_area ON member_history (student_area);
+        CREATE INDEX IF NOT EXISTS history_end_date ON member_history (end_date);
+        CREATE INDEX IF NOT EXISTS members_center ON members (student_center);
+        CREATE INDEX IF NOT EXISTS members_area ON members (student_area);
+        CREATE INDEX IF NOT EXISTS members_end_date ON members (end_date);
+        """
+    )
+    return conn
+
+
+def to_records(df_clean: pd.DataFrame) -> list:
+    """Return the rows of member_columns as python values, dates as text and None for missing."""
+    df_ = df_clean[list(member_columns)].astype(object)
+    for col in date_columns:
+        df_[col] = df_clean[col].dt.strftime("%Y-%m-%d %H:%M:%S").astype(object)
+    df_["is_cpt"] = df_clean["is_cpt"].astype(int)
+    return list(df_.where(df_.notna(), None).itertuples(index=False, name=None))
+
+
+def upsert(df_clean: pd.DataFrame, month: str, path) -> None:
+    """Save the cleaned member data of a month to the store.
+    The month replaces its previous rows in member_history. In members, a code takes the row
+    of its latest month and the first month is kept, so the months can be added in any order.
+
+    :param pd.DataFrame df_clean: cleaned member data of the month, one row per student_code.
+    :param str month: the month, like 2024-05.
+    :param path: sqlite file.
+    """
+    records = to_records(df_clean)
+    cols = list(member_columns)
+    # note: a row of an older month only moves first_month back
+    update_cols = ",\n".join(
+        f"{col} = CASE WHEN excluded.last_month >= members.last_month "
+        f"THEN excluded.{col} ELSE members.{col} END"
+        for col in cols[1:]
+    )
+    with closing(connect(path)) as conn, conn:
+        conn.execute("DELETE FROM member_history WHERE month = ?", (month,))
+        conn.executemany(
+            f"INSERT INTO member_history (month, {', '.join(cols)}) "
+            f"VALUES ({', '.join('?' * (len(cols) + 1))})",
+            [(month, *record) for record in records],
+        )
+        conn.executemany(
+            f"""
+            INSERT INTO members ({', '.join(cols)}, first_month, last_month)
+            VALUES ({', '.join('?' * (len(cols) + 2))})
+            ON CONFLICT (student_code) DO UPDATE SET
+            {update_cols},
+            first_month = MIN(members.first_month, excluded.first_month),
+            last_month = MAX(members.last_month, excluded.last_month)
+            """,
+            [(*record, month, month) for record in records],
+        )
+
+
+def query(sql: str, path, params: tuple = ()) -> pd.DataFrame:
+    """Run a query on the store, the date columns are parsed."""
+    with closing(connect(path)) as conn:
+        df = pd.read_sql_query(sql, conn, params=params)
+    for col in date_columns:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def get_history(student_code: str, path) -> pd.DataFrame:
+    """Return the rows of a member in every month it was in, oldest first.
+
+    :param str student_code: code like Deluxe 10000, see module.create_student_code.
+    :param path: sqlite file.
+    :return pd.DataFrame: member history.
+    """
+    return query(
+        "SELECT * FROM member_history WHERE student_code = ? ORDER BY month", path, (student_code,)
+    )
+
+
+def get_snapshot(date, path) -> pd.DataFrame:
+    """Return the members active on a date, as they were known then.
+    Each code takes its row of the latest month up to the month of the date.
+
+    :param date: the date, like 2024-03-15.
+    :param path: sqlite file.
+    :return pd.DataFrame: active members.
+    """
+    date = pd.Timestamp(date)
+    return query(
+        """
+        SELECT history.* FROM member_history AS history
+        JOIN (
+            SELECT student_code, MAX(month) AS month FROM member_history
+            WHERE month <= ? GROUP BY student_code
+        ) AS latest USING (student_code, month)
+        WHERE history.start_date < ? AND history.end_date >= ?
+        ORDER BY history.student_code
+        """,
+        path,
+        (
+            f"{date:%Y-%m}",
+            f"{date + pd.Timedelta(days=1):%Y-%m-%d}",
+            f"{date:%Y-%m-%d}",
+        ),
+    )
+
+
+def get_center_changes(path) -> pd.DataFrame:
+    """Return the codes which were in more than one center, with their centers by month."""
+    return query(
+        """
+        SELECT student_code, month, student_center, student_area FROM member_history
+        WHERE student_code IN (
+            SELECT student_code FROM member_history
+            GROUP BY student_code HAVING COUNT(DISTINCT student_center) > 1
+        )
+        ORDER BY student_code, month
+        """,
+        path,
+    )
@@ -0,0 +1,151 @@
+"""Synthetic Coco extracts, to measure how the cleaning scales past the real data size.
+The extracts follow the real data: center markers in the names, (GO) / (DLX) / CPT members,
+consultants from config.map_consultant, repeated downloads and freeze / cad sales name conflicts.
+"""
+import re
+from typing import List
+import numpy as np
+import pandas as pd
+import config
+
+# note: names must not contain a center marker, the center is extracted from anywhere in the name
+name_parts = [
+    "ADI", "AGUS", "ANDI", "ANISA", "ARIF", "BUDI", "CAHYA", "DEWI", "DIMAS", "EKA", "FAJAR",
+    "FITRI", "HADI", "HENDRA", "IKA", "INDAH", "JOKO", "KARTIKA", "LESTARI", "MAYA", "NANDA",
+    "NUR", "PUTRI", "RAHMA", "RINA", "RIZKY", "SARI", "SITI", "TAUFIK", "TIARA", "UTAMI",
+    "WAHYU", "WULAN", "YOGA", "YUNI", "ZAHRA",
+]
+# share of members per membership
+membership_weights = {"Deluxe": 0.5, "Go": 0.33, "VIP": 0.1, "Street Talk": 0.02, "CPT": 0.05}
+
+
+def get_names(rng: np.random.Generator, size: int) -> np.ndarray:
+    """Random names of one or two parts, without any center marker."""
+    center_pattern = re.compile("|".join(config.centers))
+    parts = np.array([part for part in name_parts if not center_pattern.search(part)])
+    first = rng.choice(parts, size)
+    second = rng.choice(np.append(parts, ""), size)
+    return np.char.strip(np.char.add(np.char.add(first, " "), second))
+
+
+def generate_members(n_members: int, seed: int = 0) -> pd.DataFrame:
+    """Generate one row per member, with the columns of config.extract_dtypes.
+
+    :param int n_members: number of members.
+    :param int seed: seed of the random generator.
+    :return pd.DataFrame: members.
+    """
+    rng = np.random.default_rng(seed)
+    memberships = rng.choice(
+        list(membership_weights), n_members, p=list(membership_weights.values())
+    )
+    offline_centers = [
+        center for area in ["JKT 1", "JKT 2", "JKT 3", "BDG", "SBY"]
+        for center in config.map_areas[area]
+    ]
+    centers = rng.choice(offline_centers, n_members)
+    # some deluxe / VIP members have no center marker, their center comes from the consultant
+    no_marker = rng.random(n_members) < 0.1
+    mapped_consultants = list(config.map_consultant)
+    consultants = rng.choice(mapped_consultants, n_members)
+    is_cpt_consultant = (memberships == "CPT") & (rng.random(n_members) < 0.5)
+    consultants[is_cpt_consultant] = rng.choice(config.cpt_consultants, is_cpt_consultant.sum())
+
+    markers = np.select(
+        [
+            memberships == "Go",
+            memberships == "Street Talk",
+            memberships == "CPT",
+            no_marker,
+            memberships == "Deluxe",
+        ],
+        [
+            np.full(n_members, " (GO)"),
+            np.full(n_members, " (STREET TALK)"),
+            np.full(n_members, " (CPT)"),
+            np.full(n_members, ""),
+            np.char.add(np.char.add(" (DLX ", centers), ")"),
+        ],
+        default=np.char.add(np.char.add(" (", centers), ")"),
+    )
+    last_names = np.char.add(get_names(rng, n_members), markers)
+    first_names = get_names(rng, n_members)
+
+    start_dates = pd.Timestamp("2023-01-01") + pd.to_timedelta(
+        rng.integers(0, 730, n_members), unit="D"
+    )
+    durations = pd.to_timedelta(rng.integers(90, 730, n_members), unit="D")
+    start_levels = rng.integers(1, 12, n_members)
+    current_levels = (start_levels + rng.integers(0, 8, n_members)).astype(float)
+    current_levels[rng.random(n_members) < 0.05] = np.nan
+    emails = pd.Series(first_names).str.replace(" ", ".").str.lower() + pd.Series(
+        np.arange(n_members).astype(str)
+    ) + "@mail.com"
+
+    return pd.DataFrame(
+        {
+            "Last Name": pd.Series(last_names).str.title(),
+            "First Name": pd.Series(first_names).str.title(),
+            "Student Code": np.arange(1, n_members + 1),
+            "Date of Birth": pd.Timestamp("1970-01-01")
+            + pd.to_timedelta(rng.integers(0, 12_000, n_members), unit="D"),
+            "Mobile": "+62-8" + pd.Series(rng.integers(10**9, 10**10, n_members).astype(str)),
+            "Email": emails,
+            "Service Type": np.where(memberships == "VIP", "VIP", "Standard"),
+            "Consultant": pd.Series(consultants).str.title(),
+            "Start Date": start_dates,
+            "End Date": start_dates + durations - pd.Timedelta(seconds=1),
+            "Start Level": start_levels.astype(float),
+            "Current Level": current_levels,
+            "Contract Status": rng.choice(
+                [status for status in config.contract_statuses if status != "Invalid"], n_members
+            ),
+        }
+    )
+
+
+def add_name_conflicts(df: pd.DataFrame, rng: np.random.Generator, share: float) -> pd.DataFrame:
+    """Add second rows for some codes with another name, like the real extract has.
+    Half are freezed / cad sales accounts of the same person (same email),
+    half are another person with an invalid contract (different email).
+    """
+    offline = ~df["Last Name"].str.upper().str.contains(r"\(GO\)|STREET TALK|\(CPT\)")
+    conflicts = df.loc[offline].sample(frac=share, random_state=rng.integers(2**32)).copy()
+    same_person = rng.random(len(conflicts)) < 0.5
+
+    suffix = np.where(rng.random(len(conflicts)) < 0.5, " Freeze For 1 Month", " Cad_Sales")
+    conflicts.loc[same_person, "First Name"] += suffix[same_person]
+    conflicts.loc[~same_person, "First Name"] = get_names(rng, (~same_person).sum())
+    conflicts.loc[~same_person, "Email"] = "other." + conflicts.loc[~same_person, "Email"]
+    conflicts.loc[~same_person, "Contract Status"] = "Invalid"
+    # older contract, otherwise it is dropped as a duplicate of code + end date
+    conflicts["End Date"] -= pd.Timedelta(days=30)
+    return pd.concat([df, conflicts], ignore_index=True)
+
+
+def generate_extracts(
+    n_members: int, n_files: int = 4, conflict_share: float = 0.02, seed: int = 0
+) -> List[pd.DataFrame]:
+    """Generate the extracts of one month, like parse_extract returns them.
+    Each file is one download, holding a random ~60% of the rows,
+    so most rows are in 2 or more files like the real downloads.
+
+    :param int n_members: number of members.
+    :param int n_files: number of downloaded files.
+    :param float conflict_share: share of offline members with a second name for their code.
+    :param int seed: seed of the random generator.
+    :return List[pd.DataFrame]: extracts.
+    """
+    rng = np.random.default_rng(seed)
+    members = add_name_conflicts(generate_members(n_members, seed), rng, conflict_share)
+    members = members.astype(
+        {
+            col: dtype
+            for col, dtype in config.extract_dtypes.items()
+            if col not in config.extract_date_columns
+        }
+    )
+    return [
+        members.loc[rng.random(len(members)) < 0.6].reset_index(drop=True)
+        for _ in range(n_files)
+    ]
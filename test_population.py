@@ -0,0 +1,24 @@
+import pandas as pd
+import population
+
+
+def test_extended_contract_is_counted_once():
+    # the contract of Deluxe 1 is extended from March to June between the two months
+    df_months = pd.DataFrame(
+        {
+            "student_code": ["Deluxe 1", "Deluxe 2", "Deluxe 1", "Deluxe 2"],
+            "student_center": ["GC", "PP", "GC", "PP"],
+            "start_date": pd.to_datetime(["2024-01-01", "2024-02-01", "2024-01-01", "2024-02-01"]),
+            "end_date": pd.to_datetime(["2024-03-31", "2024-04-30", "2024-06-30", "2024-04-30"]),
+        }
+    )
+    contracts = population.get_contracts(df_months)
+    assert len(contracts) == 2
+    assert contracts.loc[contracts["student_code"] == "Deluxe 1", "end_date"].item() == pd.Timestamp(
+        "2024-06-30"
+    )
+
+    counts = population.get_population(contracts, start="2024-03-15", end="2024-06-30")
+    assert counts.loc["2024-03-15"].to_dict() == {"GC": 1, "PP": 1}
+    assert counts.loc["2024-05-15"].to_dict() == {"GC": 1, "PP": 0}
+    assert counts.loc["2024-06-30"].to_dict() == {"GC": 1, "PP": 0}
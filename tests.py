@@ -1,83 +1,102 @@
+from itertools import chain
+import numpy as np
+import pandas as pd
 import config
 
+expected_memberships_with_st = ["Deluxe", "Go", "Street Talk", "VIP"]
+expected_memberships_without_st = ["Deluxe", "Go", "VIP"]
 
-def test_all_memberships_are_filled(df_clean, student_membership_col):
-    """
-    All memberships should be filled with no blank.
-    """
-    expected_memberships_with_st = ["Deluxe", "Go", "Street Talk", "VIP"]
-    expected_memberships_without_st = ["Deluxe", "Go", "VIP"]
-    unique_memberships = sorted(df_clean[student_membership_col].dropna().unique())
-    assert (
-        expected_memberships_with_st == unique_memberships
-        or expected_memberships_without_st == unique_memberships
-    ), f"Membership test failed. Expected {expected_memberships_with_st} or {expected_memberships_without_st}, get {unique_memberships}."
-
-
-def test_all_centers_are_filled(df_clean, student_center_col):
-    """
-    All centers should be filled with no blank.
-    """
 
-    from itertools import chain
-
-    centers_nested = list(config.map_areas.values())
-    centers = list(chain(*centers_nested))
-
-    unmapped = set(df_clean[student_center_col].unique()) - set(centers)
-    assert (
-        not unmapped
-    ), f"test_all_centers_are_filled failed, {unmapped} is incorrectly mapped"
-
-
-def test_all_areas_are_filled(df_clean, student_area_col):
+def sample_codes(df_clean: pd.DataFrame, code_col: str, sample: int, seed: int = 0) -> pd.DataFrame:
+    """Return the rows of a random subset of codes, about sample rows in total.
+    Whole codes are kept so that the rules on codes still hold for the sample.
     """
-    All areas should be filled with no blank.
+    codes = df_clean[code_col].drop_duplicates()
+    frac = min(1, sample / max(len(df_clean), 1))
+    return df_clean.loc[df_clean[code_col].isin(codes.sample(frac=frac, random_state=seed))]
+
+
+def validate(
+    df_clean: pd.DataFrame,
+    code_col: str = "student_code",
+    name_col: str = "student_name",
+    student_membership_col: str = "student_membership",
+    student_center_col: str = "student_center",
+    student_area_col: str = "student_area",
+    is_cpt_col: str = "is_cpt",
+    candidate_codes: list = None,
+    sample: int = None,
+) -> dict:
+    """Check every rule on the cleaned member data and report all failures at once.
+    Each rule is one vectorized mask over the columns it needs, so the data is scanned once per rule
+    instead of once per unique value or group.
+
+    :param pd.DataFrame df_clean: cleaned member data.
+    :param list candidate_codes: the only codes which can have multiple names,
+        for example attrs["multiple_name_codes"] from module.resolve_multiple_names.
+        None to group all codes.
+    :param int sample: validate about this many rows only (whole codes), None for all rows.
+        The check that every membership exists is skipped on a sample.
+    :return dict: for each rule, passed, index of the offending rows and detail.
     """
-    unmapped = set(df_clean[student_area_col].unique()) - set(config.map_areas.keys())
-    assert (
-        not unmapped
-    ), f"test_all_areas_are_filled failed, {unmapped} is incorrectly mapped"
-
-
-def test_cpt_members_in_cpt_area(
-    df_clean, is_cpt_col, student_center_col, student_area_col
-):
-    """
-    All corporate should be in corporate center and area.
-    """
-    assert (
-        not (
-            df_clean.loc[df_clean[is_cpt_col], [student_center_col, student_area_col]]
-            != "Corporate"
-        )
-        .sum()
-        .sum()
-    ), "test_cpt_members_in_cpt_area failed"
-
-
-def test_noncpt_members_in_noncpt_area(df_clean, is_cpt_col):
-    """
-    All corporate should be in corporate center and area.
-    """
-    assert (
-        not (
-            df_clean.loc[~(df_clean[is_cpt_col]), ["student_center", "student_area"]]
-            == "Corporate"
-        )
-        .sum()
-        .sum()
-    ), "test_noncpt_members_in_noncpt_area"
+    if sample is not None and sample < len(df_clean):
+        df_clean = sample_codes(df_clean, code_col, sample)
+
+    def result(offending, detail: str, passed: bool = None) -> dict:
+        rows = df_clean.index[np.asarray(offending)].tolist()
+        return {
+            "passed": not rows if passed is None else passed and not rows,
+            "rows": rows,
+            "detail": detail,
+        }
+
+    report = {}
+
+    # all memberships should be filled with no blank
+    membership = df_clean[student_membership_col]
+    unique_memberships = set(membership.dropna().unique())
+    missing = [m for m in expected_memberships_without_st if m not in unique_memberships]
+    # note: blank memberships are not counted, same as the unique memberships
+    report["all_memberships_are_filled"] = result(
+        membership.notna() & ~membership.isin(expected_memberships_with_st),
+        f"Expected {expected_memberships_with_st} or {expected_memberships_without_st}, "
+        f"get {sorted(unique_memberships)}.",
+        passed=sample is not None or not missing,
+    )
 
+    # all centers and areas should be mapped in config.map_areas
+    centers = list(chain(*config.map_areas.values()))
+    center = df_clean[student_center_col]
+    report["all_centers_are_filled"] = result(
+        ~center.isin(centers),
+        f"Incorrectly mapped centers: {set(center[~center.isin(centers)].unique())}.",
+    )
+    area = df_clean[student_area_col]
+    report["all_areas_are_filled"] = result(
+        ~area.isin(list(config.map_areas)),
+        f"Incorrectly mapped areas: {set(area[~area.isin(list(config.map_areas))].unique())}.",
+    )
 
-def test_one_code_is_one_name(df_clean, code_col, name_col):
-    """One code must have one name only."""
+    # all corporate should be in corporate center and area, and only corporate
+    is_cpt = df_clean[is_cpt_col].astype(bool)
+    is_corporate = (center == "Corporate") | (area == "Corporate")
+    is_all_corporate = (center == "Corporate") & (area == "Corporate")
+    report["cpt_members_in_cpt_area"] = result(
+        is_cpt & ~is_all_corporate, "CPT members outside the Corporate center or area."
+    )
+    report["noncpt_members_in_noncpt_area"] = result(
+        ~is_cpt & is_corporate, "Non CPT members in the Corporate center or area."
+    )
 
-    count_multiple = (
-        df_clean.groupby(code_col)
-        .agg(count_student_name=(name_col, "nunique"))
-        .reset_index()
-        .loc[lambda df_: df_["count_student_name"] > 1, code_col]
-        .tolist()
+    # one code must have one name only
+    codes = df_clean[code_col]
+    candidates = codes.isin(candidate_codes) if candidate_codes is not None else codes.notna()
+    count_names = df_clean.loc[candidates].groupby(code_col)[name_col].transform("nunique")
+    # note: set by position, the index of the cleaned data can have duplicated labels
+    multiple_name = np.zeros(len(df_clean), dtype=bool)
+    multiple_name[candidates.to_numpy()] = count_names.to_numpy() > 1
+    report["one_code_is_one_name"] = result(
+        multiple_name,
+        f"Some codes have multiple names: {sorted(codes[multiple_name].unique())}.",
     )
-    assert not count_multiple, f"Some codes have multiple names: {count_multiple}"
+    return report
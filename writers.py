@@ -0,0 +1,127 @@
+"""Writers of the cleaned member data, one per output format, and the readers to load it back.
+Downstream reports can load the parquet / feather file instead of parsing the xlsx.
+"""
+import os
+from pathlib import Path
+from typing import List
+import pandas as pd
+import xlsxwriter
+
+
+def write_xlsx(df_clean: pd.DataFrame, filepath, chunksize: int = 10_000) -> None:
+    """Write an xlsx with xlsxwriter in constant_memory mode.
+    Rows are flushed to disk as they are written, so the workbook is never held in memory.
+    pandas to_excel cannot be used for this, it writes the cells column by column.
+
+    :param pd.DataFrame df_clean: cleaned member data.
+    :param filepath: path of the xlsx.
+    :param int chunksize: rows converted to python values at once.
+    """
+    workbook = xlsxwriter.Workbook(
+        filepath,
+        {"constant_memory": True, "default_date_format": "yyyy-mm-dd hh:mm:ss"},
+    )
+    worksheet = workbook.add_worksheet()
+    # same header style as pandas to_excel
+    header_format = workbook.add_format(
+        {"bold": True, "border": 1, "align": "center", "valign": "top"}
+    )
+    worksheet.write_row(0, 0, list(df_clean.columns), header_format)
+
+    row_idx = 1
+    for start in range(0, len(df_clean), chunksize):
+        chunk = df_clean.iloc[start : start + chunksize]
+        # python values, missing values as None so that the cell is left blank
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            worksheet.write_row(row_idx, 0, row)
+            row_idx += 1
+    workbook.close()
+
+
+def write_parquet(df_clean: pd.DataFrame, filepath) -> None:
+    """Write a parquet file, needs pyarrow."""
+    df_clean.to_parquet(filepath, index=False)
+
+
+def write_feather(df_clean: pd.DataFrame, filepath) -> None:
+    """Write a feather file, needs pyarrow."""
+    df_clean.reset_index(drop=True).to_feather(filepath)
+
+
+def write_csv(df_clean: pd.DataFrame, filepath) -> None:
+    """Write a csv file."""
+    df_clean.to_csv(filepath, index=False)
+
+
+# output format: writer
+writers = {
+    "xlsx": write_xlsx,
+    "parquet": write_parquet,
+    "feather": write_feather,
+    "csv": write_csv,
+}
+
+
+def write(df_clean: pd.DataFrame, output_path, name: str, formats: List[str]) -> List[Path]:
+    """Write the cleaned member data in every format.
+    Each file is written to a temp file first and then renamed, so that a reader in another process
+    (like the delta of the next month in batch.py) never sees a half written file.
+    The files of the other formats are deleted, so that read never finds an older output.
+
+    :param pd.DataFrame df_clean: cleaned member data.
+    :param output_path: output folder.
+    :param str name: file name without extension.
+    :param List[str] formats: formats to write, keys of writers.
+    :return List[Path]: written files.
+    :raises ValueError: if a format has no writer.
+    """
+    unknown = [fmt for fmt in formats if fmt not in writers]
+    if unknown:
+        raise ValueError(f"No writer for {unknown}, choose from {list(writers)}.")
+
+    Path(output_path).mkdir(parents=True, exist_ok=True)
+    filepaths = []
+    for fmt in formats:
+        filepath = Path(output_path, f"{name}.{fmt}")
+        tmp_path = Path(output_path, f"{name}.{fmt}.{os.getpid()}.tmp")
+        try:
+            writers[fmt](df_clean, tmp_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.replace(tmp_path, filepath)
+        filepaths.append(filepath)
+    for fmt in writers:
+        if fmt not in formats:
+            Path(output_path, f"{name}.{fmt}").unlink(missing_ok=True)
+    return filepaths
+
+
+def read_xlsx(filepath) -> pd.DataFrame:
+    """Read an xlsx written by write_xlsx, the phone numbers are kept as text."""
+    return pd.read_excel(filepath, dtype={"mobile": str})
+
+
+# output format: reader, fastest first
+# note: no csv, it loses the dtypes
+readers = {
+    "parquet": pd.read_parquet,
+    "feather": pd.read_feather,
+    "xlsx": read_xlsx,
+}
+
+
+def read(output_path, name: str) -> pd.DataFrame:
+    """Read the cleaned member data from the fastest format written in output_path.
+
+    :param output_path: output folder.
+    :param str name: file name without extension.
+    :return pd.DataFrame: cleaned member data.
+    :raises FileNotFoundError: if no format of readers is in output_path.
+    """
+    for fmt, reader in readers.items():
+        filepath = Path(output_path, f"{name}.{fmt}")
+        if filepath.exists():
+            return reader(filepath)
+    raise FileNotFoundError(f"No {name}.{{{','.join(readers)}}} in {output_path}.")